@@ -0,0 +1,232 @@
+'''strongly connected components and attractors of state graphs: steady
+   states, cycles and the states leading into them.
+
+   everything runs on the CSR arrays of a StateGraph (or MappedStateGraph)
+   with explicit stacks, in time linear in its nodes and edges, so large
+   envisionments need no recursion. nodes are given by key or id, and
+   results are node and component ids.'''
+
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple, Union
+from array import array
+from qr_types import *
+
+import collections
+
+@dataclass(frozen=True)
+class Condensation:
+    '''the strongly connected components of a state graph and the DAG between
+       them. components are numbered in reverse topological order: every DAG
+       edge goes from a higher to a lower component id.'''
+    component: array            # component id per node id
+    members: List[List[int]]    # node ids per component
+    out_offsets: array          # CSR adjacency of the DAG, deduplicated
+    out_targets: array
+
+    def successors(self, c: int) -> array:
+        return self.out_targets[self.out_offsets[c]:self.out_offsets[c + 1]]
+
+    def is_terminal(self, c: int) -> bool:
+        '''no edge leaves the component: an attractor'''
+        return self.out_offsets[c] == self.out_offsets[c + 1]
+
+def node_count(sg: StateGraph) -> int:
+    return len(sg.out_offsets) - 1
+
+def node_id(sg: StateGraph, k: Union[str, int]) -> int:
+    return k if isinstance(k, int) else sg.ids[k]
+
+def strongly_connected_components(sg: StateGraph) -> Tuple[array, int]:
+    '''Tarjan's algorithm with an explicit stack: the component id of every
+       node, in reverse topological order, and the number of components'''
+    n = node_count(sg)
+    offsets = sg.out_offsets
+    targets = sg.out_targets
+    index = array('q', [-1]) * n
+    low = array('q', [0]) * n
+    component = array('q', [-1]) * n
+    stack = []
+    count = 0
+    counter = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        # call stack items: (node, position of its next edge)
+        calls = [(root, offsets[root])]
+        while calls:
+            (v, i) = calls[-1]
+            end = offsets[v + 1]
+            while i < end:
+                w = targets[i]
+                i += 1
+                if index[w] == -1:
+                    break
+                if component[w] == -1:
+                    low[v] = min(low[v], index[w])
+            else:
+                # all edges of v are done
+                calls.pop()
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        component[w] = count
+                        if w == v:
+                            break
+                    count += 1
+                if calls:
+                    u = calls[-1][0]
+                    low[u] = min(low[u], low[v])
+                continue
+            # descend into w, resuming v after it
+            calls[-1] = (v, i)
+            index[w] = low[w] = counter
+            counter += 1
+            stack.append(w)
+            calls.append((w, offsets[w]))
+    return (component, count)
+
+def condensation(sg: StateGraph) -> Condensation:
+    '''the strongly connected components of a state graph and the DAG between them'''
+    (component, count) = strongly_connected_components(sg)
+    members = [[] for _ in range(count)]
+    for v, c in enumerate(component):
+        members[c].append(v)
+    offsets = sg.out_offsets
+    targets = sg.out_targets
+    dag_offsets = array('q', [0]) * (count + 1)
+    dag_targets = array('q')
+    seen = array('q', [-1]) * count
+    for c in range(count):
+        for v in members[c]:
+            for i in range(offsets[v], offsets[v + 1]):
+                d = component[targets[i]]
+                if d != c and seen[d] != c:
+                    seen[d] = c
+                    dag_targets.append(d)
+        dag_offsets[c + 1] = len(dag_targets)
+    return Condensation(component, members, dag_offsets, dag_targets)
+
+class ReachSets(Mapping):
+    '''the nodes reachable from each of some nodes of a graph (itself
+       included), as bitsets over node ids, keyed by node key. a set is
+       computed on lookup by walking the condensation from the node's
+       component, so memory stays linear in the graph rather than holding a
+       bitset per node.'''
+
+    def __init__(self, sg: StateGraph, keys: Optional[List[Hashable]] = None):
+        self.sg = sg
+        self.domain = list(sg.keys) if keys is None else keys
+        self.members = set(self.domain)
+        self.cond = condensation(sg)
+
+    def __getitem__(self, k: Hashable) -> int:
+        if k not in self.members:
+            raise KeyError(k)
+        cond = self.cond
+        start = cond.component[self.sg.ids[k]]
+        bits = bytearray((node_count(self.sg) + 7) // 8)
+        seen = {start}
+        todo = [start]
+        while todo:
+            c = todo.pop()
+            for v in cond.members[c]:
+                bits[v >> 3] |= 1 << (v & 7)
+            for d in cond.successors(c):
+                if d not in seen:
+                    seen.add(d)
+                    todo.append(d)
+        return int.from_bytes(bits, 'little')
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.domain)
+
+    def __len__(self) -> int:
+        return len(self.domain)
+
+def terminal_components(cond: Condensation) -> List[int]:
+    '''the attractors: components no edge leaves. a single node is a steady
+       state (state graphs have no self-loops), more nodes form a cycle.'''
+    return [c for c in range(len(cond.members)) if cond.is_terminal(c)]
+
+def source_components(cond: Condensation) -> List[int]:
+    '''the components no edge enters: every node is reachable from one of them'''
+    entered = set(cond.out_targets)
+    return [c for c in range(len(cond.members)) if c not in entered]
+
+def attractor_reach(cond: Condensation) -> List[int]:
+    '''per component, a bitset over terminal_components positions of the
+       attractors it can reach. computed in one pass in component order, as
+       every DAG edge points to a lower component id.'''
+    terminals = {c: i for i, c in enumerate(terminal_components(cond))}
+    reach = [0] * len(cond.members)
+    for c in range(len(cond.members)):
+        if c in terminals:
+            reach[c] = 1 << terminals[c]
+        else:
+            bits = 0
+            for d in cond.successors(c):
+                bits |= reach[d]
+            reach[c] = bits
+    return reach
+
+def basins(cond: Condensation, strict: bool = False) -> Dict[int, List[int]]:
+    '''the basin of each attractor: the node ids that can reach it, or with
+       strict, the node ids that can reach no other attractor'''
+    terminals = terminal_components(cond)
+    reach = attractor_reach(cond)
+    result = {c: [] for c in terminals}
+    for c, bits in enumerate(reach):
+        if strict and bits & (bits - 1):
+            continue
+        for i, t in enumerate(terminals):
+            if bits >> i & 1:
+                result[t].extend(cond.members[c])
+    for nodes in result.values():
+        nodes.sort()
+    return result
+
+def shortest_path(sg: StateGraph, a: Union[str, int], b: Union[str, int]) -> Optional[List[int]]:
+    '''the node ids of a shortest behaviour path from a to b, by breadth-first
+       search, or None if b cannot be reached'''
+    (a, b) = (node_id(sg, a), node_id(sg, b))
+    offsets = sg.out_offsets
+    targets = sg.out_targets
+    parent = {a: a}
+    todo = collections.deque([a])
+    while todo and b not in parent:
+        v = todo.popleft()
+        for i in range(offsets[v], offsets[v + 1]):
+            w = targets[i]
+            if w not in parent:
+                parent[w] = v
+                todo.append(w)
+    if b not in parent:
+        return None
+    path = [b]
+    while path[-1] != a:
+        path.append(parent[path[-1]])
+    return path[::-1]
+
+# node colours of the analysis in DOT drawings
+STEADY_COLOR = 'palegreen'
+CYCLE_COLOR = 'lightskyblue'
+TRANSIENT_CYCLE_COLOR = 'khaki'
+
+def component_colors(cond: Condensation) -> Dict[int, str]:
+    '''fill colours by node id for export.iter_dot: steady states, terminal
+       cycles and cycles that can be left. other nodes are not coloured.'''
+    colors = {}
+    for c, nodes in enumerate(cond.members):
+        if cond.is_terminal(c):
+            color = STEADY_COLOR if len(nodes) == 1 else CYCLE_COLOR
+        elif len(nodes) > 1:
+            color = TRANSIENT_CYCLE_COLOR
+        else:
+            continue
+        for v in nodes:
+            colors[v] = color
+    return colors
@@ -0,0 +1,80 @@
+'''vectorized transition checks over batches of candidate states.
+   candidates are N x Q int matrices of pair codes (magnitude index * 3 +
+   derivative code), with columns in the entity's quantity order as in packed.py.'''
+
+from typing import Dict, List, Tuple
+from qr_types import *
+from packed import *
+
+import numpy as np
+
+def encode_candidates(codec: StateCodec, states: List[EntityState]) -> np.ndarray:
+    '''encode EntityStates as rows of a candidate matrix'''
+    return np.array([
+        [table.index[state.state[k].magnitude] * 3 + DERIVATIVE_CODES[state.state[k].derivative] for k, table in zip(codec.names, codec.tables)]
+        for state in states
+    ], dtype=np.int64).reshape(len(states), len(codec.names))
+
+def derivative_candidates(codec: StateCodec, magnitudes: EntityState, derivatives: List[Dict[str, Direction]]) -> np.ndarray:
+    '''a candidate matrix combining the magnitudes of a state with each set of derivatives'''
+    base = np.array([table.index[magnitudes.state[k].magnitude] * 3 for k, table in zip(codec.names, codec.tables)], dtype=np.int64)
+    codes = np.array([[DERIVATIVE_CODES[deriv_dict[k]] for k in codec.names] for deriv_dict in derivatives], dtype=np.int64)
+    return base + codes.reshape(len(derivatives), len(codec.names))
+
+def source_vectors(codec: StateCodec, source: EntityState) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    '''magnitude indices, derivative signs and point flags of a source state'''
+    pairs = [source.state[k] for k in codec.names]
+    magnitudes = np.array([table.index[pair.magnitude] for table, pair in zip(codec.tables, pairs)], dtype=np.int64)
+    derivatives = np.array([DERIVATIVE_CODES[pair.derivative] - 1 for pair in pairs], dtype=np.int64)
+    points = np.array([table.points[idx] for table, idx in zip(codec.tables, magnitudes)], dtype=bool)
+    return (magnitudes, derivatives, points)
+
+def split_candidates(candidates: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''magnitude indices and derivative signs of a candidate matrix'''
+    return (candidates // 3, candidates % 3 - 1)
+
+def continuous_mask(codec: StateCodec, source: EntityState, candidates: np.ndarray) -> np.ndarray:
+    '''check_continuous for each candidate'''
+    (magnitudes, derivatives, _) = source_vectors(codec, source)
+    (mags, ders) = split_candidates(candidates)
+    return ((ders * derivatives != -1) & (np.abs(mags - magnitudes) <= 1)).all(axis=1)
+
+def point_range_mask(codec: StateCodec, source: EntityState, candidates: np.ndarray) -> np.ndarray:
+    '''check_point_range for each candidate'''
+    (magnitudes, _, points) = source_vectors(codec, source)
+    changed = candidates // 3 != magnitudes
+    return ~((changed & points).any(axis=1) & (changed & ~points).any(axis=1))
+
+def not_equal_mask(codec: StateCodec, source: EntityState, candidates: np.ndarray) -> np.ndarray:
+    '''check_not_equal for each candidate'''
+    return (candidates != encode_candidates(codec, [source])).any(axis=1)
+
+def transition_mask(codec: StateCodec, source: EntityState, candidates: np.ndarray) -> np.ndarray:
+    '''check_transition for each candidate'''
+    return continuous_mask(codec, source, candidates) & point_range_mask(codec, source, candidates) & not_equal_mask(codec, source, candidates)
+
+def magnitudes_match_mask(codec: StateCodec, source: EntityState, candidates: np.ndarray) -> np.ndarray:
+    '''magnitudes_match for each candidate'''
+    (magnitudes, derivatives, points) = source_vectors(codec, source)
+    # magnitude changes go by value, as in check_magnitude_changes
+    width = max(len(table.members) for table in codec.tables)
+    values = np.array([[m.value for m in table.members] + [0] * (width - len(table.members)) for table in codec.tables], dtype=np.int64)
+    rows = np.arange(len(codec.tables))
+    change = np.sign(values[rows, candidates // 3] - values[rows, magnitudes])
+    # points must move along their derivative, ranges may also stay
+    return ((change == derivatives) | (~points & (change == 0))).all(axis=1)
+
+def derivatives_match_mask(codec: StateCodec, source: EntityState, candidates: np.ndarray) -> np.ndarray:
+    '''derivatives_match for each candidate'''
+    (magnitudes, derivatives, _) = source_vectors(codec, source)
+    # combined influence per quantity; disagreeing influences (QUESTION) allow any change
+    effects = np.zeros(len(codec.names), dtype=np.int64)
+    known = np.ones(len(codec.names), dtype=bool)
+    for (qb, sources) in codec.influences:
+        nonzero = {correlation * codec.tables[qa].signs[magnitudes[qa]] for (qa, correlation) in sources} - {0}
+        if len(nonzero) == 1:
+            effects[qb] = nonzero.pop()
+        elif len(nonzero) > 1:
+            known[qb] = False
+    change = np.sign(candidates % 3 - 1 - derivatives)
+    return (~known | (change == 0) | (change == effects)).all(axis=1)
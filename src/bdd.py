@@ -0,0 +1,227 @@
+'''a small reduced ordered binary decision diagram package.
+
+   nodes are ints indexing the manager's arrays: 0 and 1 are the terminals,
+   every other node tests variable var[u] and continues to lo[u] when it is
+   false and hi[u] when it is true. variables are ints, ordered by value.
+   nodes are hash-consed, so equal functions are the same int.'''
+
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Tuple
+
+import functools
+
+FALSE = 0
+TRUE = 1
+
+class BDD:
+    def __init__(self, nvars: int):
+        self.nvars = nvars
+        # the terminals test a variable past all others
+        self.var = [nvars, nvars]
+        self.lo = [FALSE, TRUE]
+        self.hi = [FALSE, TRUE]
+        self.unique: Dict[Tuple[int, int, int], int] = {}
+        self.caches: Dict[str, Dict] = {}
+
+    def __len__(self) -> int:
+        return len(self.var)
+
+    def cache(self, op: str) -> Dict:
+        return self.caches.setdefault(op, {})
+
+    def clear_caches(self) -> None:
+        self.caches.clear()
+
+    def mk(self, v: int, lo: int, hi: int) -> int:
+        '''the node testing v, reduced and hash-consed'''
+        if lo == hi:
+            return lo
+        key = (v, lo, hi)
+        u = self.unique.get(key)
+        if u is None:
+            u = len(self.var)
+            self.var.append(v)
+            self.lo.append(lo)
+            self.hi.append(hi)
+            self.unique[key] = u
+        return u
+
+    def ithvar(self, v: int) -> int:
+        return self.mk(v, FALSE, TRUE)
+
+    def cofactors(self, u: int, v: int) -> Tuple[int, int]:
+        '''u with v set false and true, for v at or above the top variable of u'''
+        return (self.lo[u], self.hi[u]) if self.var[u] == v else (u, u)
+
+    def ite(self, f: int, g: int, h: int) -> int:
+        '''if f then g else h'''
+        if f == TRUE:
+            return g
+        if f == FALSE:
+            return h
+        if g == h:
+            return g
+        if g == TRUE and h == FALSE:
+            return f
+        cache = self.cache('ite')
+        key = (f, g, h)
+        r = cache.get(key)
+        if r is None:
+            v = min(self.var[f], self.var[g], self.var[h])
+            (f0, f1) = self.cofactors(f, v)
+            (g0, g1) = self.cofactors(g, v)
+            (h0, h1) = self.cofactors(h, v)
+            r = self.mk(v, self.ite(f0, g0, h0), self.ite(f1, g1, h1))
+            cache[key] = r
+        return r
+
+    def not_(self, f: int) -> int:
+        return self.ite(f, FALSE, TRUE)
+
+    def and_(self, f: int, g: int) -> int:
+        return self.ite(f, g, FALSE)
+
+    def or_(self, f: int, g: int) -> int:
+        return self.ite(f, TRUE, g)
+
+    def conjoin(self, fs: Iterable[int]) -> int:
+        r = TRUE
+        for f in fs:
+            r = self.and_(r, f)
+        return r
+
+    def disjoin(self, fs: Iterable[int]) -> int:
+        r = FALSE
+        for f in fs:
+            r = self.or_(r, f)
+        return r
+
+    def cube(self, assignment: Dict[int, bool]) -> int:
+        '''the conjunction of literals of an assignment'''
+        r = TRUE
+        for v in sorted(assignment, reverse=True):
+            r = self.mk(v, FALSE, r) if assignment[v] else self.mk(v, r, FALSE)
+        return r
+
+    def exists(self, f: int, vs: FrozenSet[int]) -> int:
+        '''f with the variables vs quantified existentially'''
+        if f <= TRUE:
+            return f
+        cache = self.cache('exists')
+        key = (f, vs)
+        r = cache.get(key)
+        if r is None:
+            (v, lo, hi) = (self.var[f], self.lo[f], self.hi[f])
+            if v in vs:
+                r = self.or_(self.exists(lo, vs), self.exists(hi, vs))
+            else:
+                r = self.mk(v, self.exists(lo, vs), self.exists(hi, vs))
+            cache[key] = r
+        return r
+
+    def and_exists(self, f: int, g: int, vs: FrozenSet[int]) -> int:
+        '''exists(and_(f, g), vs) without building the conjunction: the
+           relational product of image computation'''
+        if f == FALSE or g == FALSE:
+            return FALSE
+        if f == TRUE and g == TRUE:
+            return TRUE
+        if f == TRUE or f == g:
+            return self.exists(g, vs)
+        if g == TRUE:
+            return self.exists(f, vs)
+        if f > g:
+            (f, g) = (g, f)
+        cache = self.cache('and_exists')
+        key = (f, g, vs)
+        r = cache.get(key)
+        if r is None:
+            v = min(self.var[f], self.var[g])
+            (f0, f1) = self.cofactors(f, v)
+            (g0, g1) = self.cofactors(g, v)
+            lo = self.and_exists(f0, g0, vs)
+            if v in vs:
+                r = TRUE if lo == TRUE else self.or_(lo, self.and_exists(f1, g1, vs))
+            else:
+                r = self.mk(v, lo, self.and_exists(f1, g1, vs))
+            cache[key] = r
+        return r
+
+    def rename(self, f: int, mapping: Dict[int, int]) -> int:
+        '''substitute variables for variables. the mapping must keep the order of
+           the variables of f, as with interleaved current/next state variables.'''
+        cache = {}
+
+        def go(u: int) -> int:
+            if u <= TRUE:
+                return u
+            r = cache.get(u)
+            if r is None:
+                v = self.var[u]
+                r = self.mk(mapping.get(v, v), go(self.lo[u]), go(self.hi[u]))
+                cache[u] = r
+            return r
+        return go(f)
+
+    def support(self, f: int) -> FrozenSet[int]:
+        seen = set()
+        vs = set()
+        todo = [f]
+        while todo:
+            u = todo.pop()
+            if u <= TRUE or u in seen:
+                continue
+            seen.add(u)
+            vs.add(self.var[u])
+            todo += (self.lo[u], self.hi[u])
+        return frozenset(vs)
+
+    def count(self, f: int, vs: List[int]) -> int:
+        '''the number of assignments to the variables vs satisfying f, whose
+           support must lie within vs'''
+        vs = sorted(vs)
+        position = {v: i for i, v in enumerate(vs)}
+        n = len(vs)
+
+        @functools.lru_cache(maxsize=None)
+        def go(u: int) -> int:
+            # assignments to the variables from that of u onwards
+            if u <= TRUE:
+                return u
+            i = position[self.var[u]]
+            (lo, hi) = (self.lo[u], self.hi[u])
+            return (go(lo) << (level(lo) - i - 1)) + (go(hi) << (level(hi) - i - 1))
+
+        def level(u: int) -> int:
+            return n if u <= TRUE else position[self.var[u]]
+        return go(f) << level(f)
+
+    def assignments(self, f: int, vs: List[int]) -> Iterator[Dict[int, bool]]:
+        '''every assignment to the variables vs satisfying f'''
+        vs = sorted(vs)
+        assignment = {}
+
+        def go(u: int, i: int) -> Iterator[Dict[int, bool]]:
+            if u == FALSE:
+                return
+            if i == len(vs):
+                yield dict(assignment)
+                return
+            v = vs[i]
+            (u0, u1) = self.cofactors(u, v) if u > TRUE else (u, u)
+            for (bit, child) in ((False, u0), (True, u1)):
+                assignment[v] = bit
+                yield from go(child, i + 1)
+        return go(f, 0)
+
+    def size(self, f: int) -> int:
+        '''the number of nodes reachable from f, terminals included'''
+        seen = set()
+        todo = [f]
+        while todo:
+            u = todo.pop()
+            if u in seen:
+                continue
+            seen.add(u)
+            if u > TRUE:
+                todo += (self.lo[u], self.hi[u])
+        return len(seen)
@@ -0,0 +1,212 @@
+'''benchmarks of state-space generation on synthetic entities.
+
+   python bench.py --sizes 3 4 5 6 --topology chain --out bench.json
+   python bench.py --sizes 3 4 5 6 --compare bench.json
+
+   each model size times gen_full_envisionment, gen_state_graph from the seed
+   reaching the most states, next_states, gen_dot and the trace functions
+   on a sample of the envisionment, recording seconds (best of --repeat), throughput and peak
+   traced memory. --compare flags benchmarks slower than a previous run.'''
+
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from qr import *
+from graph import gen_dot
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+TOPOLOGIES = ('chain', 'mesh')
+
+def quantity_space(size: int) -> EnumMeta:
+    '''a quantity space of size values: ZERO, then alternating ranges and points'''
+    return Enum(f"Space{size}", [('ZERO', 0), *((f"V{i}", i) for i in range(1, size))])
+
+def synthetic_entity(
+    n: int,
+    topology: str = 'chain',
+    space_size: int = 3,
+    influence_density: float = 0.5,
+    proportional_density: float = 0.5,
+    correspondence_density: float = 0.5,
+    seed: int = 0) -> Entity:
+    '''an entity of n quantities q0..q{n-1} sharing one quantity space. related
+       pairs are consecutive quantities for 'chain', all ordered pairs i < j for
+       'mesh'; each pair gets an influence, a proportional and zero/top value
+       correspondences with the given probabilities.'''
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"unknown topology: {topology}")
+    space = quantity_space(space_size)
+    (zero, top) = (list(space)[0], list(space)[-1])
+    quantities = [Quantity(f"q{i}", space) for i in range(n)]
+    pairs = [(i, i + 1) for i in range(n - 1)] if topology == 'chain' else [(i, j) for i in range(n) for j in range(i + 1, n)]
+    rng = random.Random(seed)
+    relations = []
+    for (i, j) in pairs:
+        (a, b) = (quantities[i], quantities[j])
+        correlation = rng.choice((Direction.POSITIVE, Direction.NEGATIVE))
+        if rng.random() < influence_density:
+            relations.append(Influence(a, b, correlation))
+        if rng.random() < proportional_density:
+            relations.append(Proportional(a, b, correlation))
+        if rng.random() < correspondence_density:
+            relations.append(ValueCorrespondence((a.name, zero), (b.name, zero)))
+            relations.append(ValueCorrespondence((a.name, top), (b.name, top)))
+    exogenous = {q.name: i == 0 for i, q in enumerate(quantities)}
+    return make_entity(f"{topology}{n}", quantities, relations, exogenous)
+
+def measure(fn: Callable[[], int], repeat: int) -> Dict[str, Any]:
+    '''time fn, which returns how many items it processed: the best of repeat
+       runs, then one more run under tracemalloc for its peak memory'''
+    if repeat < 1:
+        raise ValueError(f"repeat must be at least 1, not {repeat}")
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': best,
+        'count': count,
+        'per_sec': count / best if best > 0 else 0.0,
+        'peak_kib': peak / 1024,
+    }
+
+def bench_entity(entity: Entity, repeat: int = 3, max_states: Optional[int] = None, sample: int = 200) -> Dict[str, Any]:
+    '''run every benchmark on one entity. the trace and next_states benchmarks
+       take the first sample states and edges of its envisionment.'''
+    env = gen_full_envisionment(entity)
+    sg = env.graph
+    seed = max(env.seeds, key=lambda k: bin(env.reachable[k]).count('1'))
+    state = sg.states[seed]
+    states = list(sg.states.values())[:sample]
+    edges = sg.edges[:sample]
+
+    def run_gen_full_envisionment() -> int:
+        return len(gen_full_envisionment(entity).graph.states)
+
+    def run_next_states() -> int:
+        for s in states:
+            next_states(s)
+        return len(states)
+
+    def run_gen_state_graph() -> int:
+        return len(gen_state_graph(state, max_states=max_states).states)
+
+    def run_gen_dot() -> int:
+        gen_dot(sg.states, sg.edges, 'id')
+        return len(sg.states)
+
+    def run_intra_state_trace() -> int:
+        for s in states:
+            intra_state_trace(s)
+        return len(states)
+
+    def run_inter_state_trace() -> int:
+        for a, b in edges:
+            inter_state_trace(sg.states[a], sg.states[b])
+        return len(edges)
+
+    return {
+        'model': {
+            'name': entity.name,
+            'quantities': len(entity.quantities),
+            'relations': len(entity.relations),
+            'states': len(sg.states),
+            'edges': sg.num_edges(),
+            'seed_states': bin(env.reachable[seed]).count('1'),
+        },
+        'benchmarks': {
+            'gen_full_envisionment': measure(run_gen_full_envisionment, repeat),
+            'next_states': measure(run_next_states, repeat),
+            'gen_state_graph': measure(run_gen_state_graph, repeat),
+            'gen_dot': measure(run_gen_dot, repeat),
+            'intra_state_trace': measure(run_intra_state_trace, repeat),
+            'inter_state_trace': measure(run_inter_state_trace, repeat),
+        },
+    }
+
+def run_benchmarks(sizes: List[int], repeat: int = 3, max_states: Optional[int] = None, **model) -> Dict[str, Any]:
+    '''benchmark synthetic entities of each size, giving a scaling curve per benchmark'''
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'model': model,
+        'results': [bench_entity(synthetic_entity(n, **model), repeat, max_states) for n in sizes],
+    }
+
+def compare(old: Dict[str, Any], new: Dict[str, Any], tolerance: float = 1.25) -> List[str]:
+    '''the benchmarks of models in both runs that got slower by more than tolerance'''
+    if old['model'] != new['model']:
+        raise ValueError(f"runs of different synthetic models: {old['model']} and {new['model']}")
+    previous = {result['model']['name']: result['benchmarks'] for result in old['results']}
+    regressions = []
+    for result in new['results']:
+        name = result['model']['name']
+        for bench, timing in result['benchmarks'].items():
+            before = previous.get(name, {}).get(bench)
+            if before is not None and timing['seconds'] > before['seconds'] * tolerance:
+                regressions.append(f"{name} {bench}: {before['seconds']:.4f}s -> {timing['seconds']:.4f}s")
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='benchmark state-space generation on synthetic entities')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[3, 4, 5])
+    parser.add_argument('--topology', choices=TOPOLOGIES, default='chain')
+    parser.add_argument('--space-size', type=int, default=3)
+    parser.add_argument('--influence-density', type=float, default=0.5)
+    parser.add_argument('--proportional-density', type=float, default=0.5)
+    parser.add_argument('--correspondence-density', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--max-states', type=int, default=None, help='state budget of gen_state_graph')
+    parser.add_argument('--out', default=None, help='a file to write the results to as JSON')
+    parser.add_argument('--compare', default=None, help='a previous result file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=1.25)
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    previous = None
+    if args.compare is not None:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    results = run_benchmarks(
+        args.sizes, args.repeat, args.max_states,
+        topology=args.topology,
+        space_size=args.space_size,
+        influence_density=args.influence_density,
+        proportional_density=args.proportional_density,
+        correspondence_density=args.correspondence_density,
+        seed=args.seed,
+    )
+    for result in results['results']:
+        model = result['model']
+        print(f"{model['name']}: {model['states']} states, {model['edges']} edges")
+        for bench, timing in result['benchmarks'].items():
+            print(f"  {bench}: {timing['seconds']:.4f}s, {timing['per_sec']:.0f}/s, {timing['peak_kib']:.0f} KiB")
+    if args.out is not None:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if previous is not None:
+        regressions = compare(previous, results, args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,131 @@
+'''streaming DOT, JSON (node-link) and GraphML writers for state graphs.
+   these write straight to a file handle without pygraphviz, which is only
+   needed to lay graphs out as images (see render.py).'''
+
+from typing import IO, Iterator
+from xml.sax.saxutils import escape
+from qr import *
+
+import json
+import os
+
+TOOLTIPS = ('yaml', 'id', 'none')
+
+# graph attributes of the state graph drawings, as set by gen_dot
+GRAPH_ATTRS = {
+    'normalize': 'True',
+    'overlap': 'False',
+    'sep': '1.2',
+    'smoothing': 'avg_dist',
+    'splines': 'True',
+}
+
+def dot_quote(s: str) -> str:
+    '''a DOT double-quoted string. newlines are kept, as pygraphviz writes them'''
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def dot_attrs(attrs: Dict[str, str]) -> str:
+    return ', '.join(f"{k}={dot_quote(v)}" for k, v in attrs.items())
+
+def iter_dot(sg: StateGraph, tooltips: str = 'id', colors: Optional[Dict[int, str]] = None) -> Iterator[str]:
+    '''the lines of the DOT source of a state graph, with the nodes, labels
+       and tooltip modes of gen_dot. colors fills nodes by id (see
+       analysis.component_colors).'''
+    if tooltips not in TOOLTIPS:
+        raise ValueError(f"unknown tooltip mode: {tooltips}")
+    yield 'strict digraph "" {\n'
+    yield f"\tgraph [{dot_attrs(GRAPH_ATTRS)}];\n"
+    yield '\tnode [shape=circle];\n'
+    names = [dot_quote(k) for k in sg.keys]
+    for idx, (k, entity_state) in enumerate(sg.states.items()):
+        attrs = {'label': pretty_print(entity_state, idx+1)}
+        if tooltips == 'yaml':
+            attrs['tooltip'] = intra_state_trace(entity_state)
+        elif tooltips == 'id':
+            attrs['tooltip'] = str(idx)
+        if colors is not None and idx in colors:
+            attrs['style'] = 'filled'
+            attrs['fillcolor'] = colors[idx]
+        yield f"\t{names[idx]} [{dot_attrs(attrs)}];\n"
+    exogenous = sg.exogenous_edges
+    for a, b in sg.edge_ids():
+        attrs = {}
+        if (a, b) in exogenous:
+            # exogenous changes are drawn dashed
+            attrs['style'] = 'dashed'
+        if tooltips == 'yaml':
+            attrs['tooltip'] = inter_state_trace(sg.states[sg.keys[a]], sg.states[sg.keys[b]])
+        elif tooltips == 'id':
+            attrs['tooltip'] = f"{a}-{b}"
+        yield f"\t{names[a]} -> {names[b]} [{dot_attrs(attrs)}];\n" if attrs else f"\t{names[a]} -> {names[b]};\n"
+    yield '}\n'
+
+def iter_json(sg: StateGraph) -> Iterator[str]:
+    '''the chunks of a node-link JSON document of a state graph: nodes carry
+       their id, key, label and state, links refer to node ids and carry the
+       EXOGENOUS label if they have one'''
+    yield '{"directed": true, "multigraph": false, "graph": {}, "nodes": ['
+    for idx, (k, entity_state) in enumerate(sg.states.items()):
+        node = {
+            'id': idx,
+            'key': k,
+            'label': pretty_print(entity_state, idx+1),
+            'state': {q: [pair.magnitude.name, pair.derivative.name] for q, pair in entity_state.state.items()},
+        }
+        yield (', ' if idx else '') + json.dumps(node)
+    yield '], "links": ['
+    exogenous = sg.exogenous_edges
+    for i, (a, b) in enumerate(sg.edge_ids()):
+        label = f", \"label\": \"{EXOGENOUS}\"" if (a, b) in exogenous else ''
+        yield f"{', ' if i else ''}{{\"source\": {a}, \"target\": {b}{label}}}"
+    yield ']}\n'
+
+def iter_graphml(sg: StateGraph) -> Iterator[str]:
+    '''the lines of a GraphML document of a state graph, with node keys and
+       labels as data, and edge kinds if there are exogenous edges'''
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+    yield '  <key id="key" for="node" attr.name="key" attr.type="string"/>\n'
+    yield '  <key id="label" for="node" attr.name="label" attr.type="string"/>\n'
+    exogenous = sg.exogenous_edges
+    if exogenous:
+        yield f'  <key id="kind" for="edge" attr.name="kind" attr.type="string"><default>{ENDOGENOUS}</default></key>\n'
+    yield '  <graph id="G" edgedefault="directed">\n'
+    for idx, (k, entity_state) in enumerate(sg.states.items()):
+        yield (f"    <node id=\"n{idx}\"><data key=\"key\">{escape(k)}</data>"
+               f"<data key=\"label\">{escape(pretty_print(entity_state, idx+1))}</data></node>\n")
+    for a, b in sg.edge_ids():
+        if (a, b) in exogenous:
+            yield f"    <edge source=\"n{a}\" target=\"n{b}\"><data key=\"kind\">{EXOGENOUS}</data></edge>\n"
+        else:
+            yield f"    <edge source=\"n{a}\" target=\"n{b}\"/>\n"
+    yield '  </graph>\n'
+    yield '</graphml>\n'
+
+def write_dot(sg: StateGraph, f: IO[str], tooltips: str = 'id', colors: Optional[Dict[int, str]] = None) -> None:
+    f.writelines(iter_dot(sg, tooltips, colors))
+
+def write_json(sg: StateGraph, f: IO[str]) -> None:
+    f.writelines(iter_json(sg))
+
+def write_graphml(sg: StateGraph, f: IO[str]) -> None:
+    f.writelines(iter_graphml(sg))
+
+def dot_source(sg: StateGraph, tooltips: str = 'id', colors: Optional[Dict[int, str]] = None) -> str:
+    return ''.join(iter_dot(sg, tooltips, colors))
+
+# writers by file extension
+WRITERS = {
+    '.dot': write_dot,
+    '.gv': write_dot,
+    '.json': write_json,
+    '.graphml': write_graphml,
+}
+
+def write_graph(sg: StateGraph, path: str) -> None:
+    '''write a state graph to a file, in the format given by its extension'''
+    ext = os.path.splitext(path)[1]
+    if ext not in WRITERS:
+        raise ValueError(f"unknown graph format: {ext}")
+    with open(path, 'w', encoding='utf-8') as f:
+        WRITERS[ext](sg, f)
@@ -1,7 +1,8 @@
-from collections import Mapping
+from collections.abc import Mapping
 
 class FrozenDict(Mapping):
     """immutable hashable dict alternative"""
+    __slots__ = ('_d', '_hash')
 
     def __init__(self, *args, **kwargs):
         self._d = dict(*args, **kwargs)
@@ -1,7 +1,20 @@
 import pygraphviz as pgv
 from qr import *
+from render import *
+from export import *
+from typing import Iterable, Optional, Tuple, Union
 
-def gen_dot(states, edges):
+import json
+import os
+
+def gen_dot(states, edges, tooltips: str = 'yaml'):
+    '''build the graphviz graph of a state graph. tooltips is one of:
+       - 'yaml': full intra/inter-state traces per node and edge (slow);
+       - 'id': node ids (`3`) and edge ids (`3-7`), traced on demand by explain
+         or looked up in a trace index (see write_trace_index);
+       - 'none': no tooltips.'''
+    if tooltips not in TOOLTIPS:
+        raise ValueError(f"unknown tooltip mode: {tooltips}")
     A = pgv.AGraph(
         directed=True,
         overlap=False,
@@ -11,35 +24,96 @@ def gen_dot(states, edges):
         smoothing='avg_dist'
     )
 
-    A.add_edges_from(edges)
+    ids = {node: idx for idx, node in enumerate(states)}
+    if tooltips == 'id':
+        for a, b in edges:
+            A.add_edge(a, b, tooltip=f"{ids[a]}-{ids[b]}")
+    else:
+        A.add_edges_from(edges)
 
     for idx, tpl in enumerate(states.items()):
         node, entity_state = tpl
         label = pretty_print(entity_state, idx+1)
-        tooltip = intra_state_trace(entity_state)
+        attrs = {'label': label}
+        if tooltips == 'yaml':
+            attrs['tooltip'] = intra_state_trace(entity_state)
+        elif tooltips == 'id':
+            attrs['tooltip'] = str(idx)
         if A.has_node(node):
-            A.get_node(node).attr['label'] = label
-            A.get_node(node).attr['tooltip'] = tooltip
+            A.get_node(node).attr.update(attrs)
         else:
-            A.add_node(node, label=label, tooltip=tooltip)
+            A.add_node(node, **attrs)
 
-    for a, b in edges:
-        e = A.get_edge(a, b)
-        tooltip = inter_state_trace(states[a], states[b])
-        e.attr['tooltip'] = tooltip
+    if tooltips == 'yaml':
+        for a, b in edges:
+            e = A.get_edge(a, b)
+            tooltip = inter_state_trace(states[a], states[b])
+            e.attr['tooltip'] = tooltip
 
     A.node_attr['shape']='circle'
     return A
 
+def explain(sg: StateGraph, a: Union[str, int], b: Union[str, int, None] = None) -> str:
+    '''the trace behind a tooltip id: intra_state_trace of node a, or
+       inter_state_trace of edge a -> b. nodes are given by key or id.'''
+    state_a = sg.states[sg.keys[a] if isinstance(a, int) else a]
+    if b is None:
+        return intra_state_trace(state_a)
+    state_b = sg.states[sg.keys[b] if isinstance(b, int) else b]
+    return inter_state_trace(state_a, state_b)
+
+def trace_index(sg: StateGraph) -> Dict:
+    '''a cheap sidecar index for 'id' tooltips: per node id its key, label and
+       state, plus the edges as id pairs. run no validity checks or yaml.'''
+    return {
+        'nodes': [
+            {
+                'id': idx,
+                'key': k,
+                'label': pretty_print(entity_state, idx+1),
+                'state': {q: [pair.magnitude.name, pair.derivative.name] for q, pair in entity_state.state.items()},
+            }
+            for idx, (k, entity_state) in enumerate(sg.states.items())
+        ],
+        'edges': [list(edge) for edge in sg.edge_ids()],
+    }
+
+def write_trace_index(sg: StateGraph, path: str) -> None:
+    '''write trace_index as JSON'''
+    with open(path, 'w') as f:
+        json.dump(trace_index(sg), f)
+
 # assert gen_dot(['a'], [('b','c')]).string() == 'strict graph "" {\n\ta;\n\tb -- c;\n}\n'
 
-def draw_state_graph(sg: StateGraph):
-    A = gen_dot(sg.states, sg.edges)
-    A.write('graph.dot')
-    A.draw('dot.svg', prog='dot')
-    A.draw('neato.svg', prog='neato')
-    A.draw('dot.png', prog='dot')
-    A.draw('neato.png', prog='neato')
-    A.draw('circo.svg', prog='circo')
-    A.draw('circo.png', prog='circo')
-    return A
+def render_state_graph(
+    sg: StateGraph,
+    tooltips: str = 'yaml',
+    layouts: Iterable[str] = LAYOUTS,
+    formats: Iterable[str] = FORMATS,
+    workers: Optional[int] = None,
+    cache_dir: str = '.render_cache',
+    out_dir: str = '.',
+    colors: Optional[Dict[int, str]] = None,
+) -> Dict[Tuple[str, str], str]:
+    '''write graph.dot and render it with each layout engine to each format,
+       see render. unchanged graphs are served from cache_dir. colors fills
+       nodes by id, as in iter_dot. returns the rendered paths by (layout, format).'''
+    source = dot_source(sg, tooltips, colors)
+    paths = render(source, layouts, formats, out_dir, cache_dir, workers)
+    with open(os.path.join(out_dir, 'graph.dot'), 'w', encoding='utf-8') as f:
+        f.write(source)
+    return paths
+
+def draw_state_graph(
+    sg: StateGraph,
+    tooltips: str = 'yaml',
+    layouts: Iterable[str] = LAYOUTS,
+    formats: Iterable[str] = FORMATS,
+    workers: Optional[int] = None,
+    cache_dir: str = '.render_cache',
+    out_dir: str = '.',
+    colors: Optional[Dict[int, str]] = None,
+):
+    '''render_state_graph, returning the graphviz graph of graph.dot'''
+    render_state_graph(sg, tooltips, layouts, formats, workers, cache_dir, out_dir, colors)
+    return pgv.AGraph(os.path.join(out_dir, 'graph.dot'))
@@ -0,0 +1,211 @@
+'''incremental re-envisionment: patch a state graph after an entity's relations
+   change, recomputing successors only for states a changed relation can affect.'''
+
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple, Union
+from qr_types import *
+from packed import *
+from prune import SIGN_MOVES, clip_signs, combine_signs, next_packed_states, next_packed_transitions, valid_packed_states
+from qr import decode_graph
+from analysis import ReachSets, condensation, source_components
+
+import collections
+import itertools
+
+@dataclass(frozen=True)
+class EntityDiff:
+    '''the relations added to and removed from an entity'''
+    added: Tuple[Relation, ...]
+    removed: Tuple[Relation, ...]
+    quantities_changed: bool
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.quantities_changed)
+
+@dataclass
+class GraphPatch:
+    '''what re-envisionment changed, by state key. recomputed counts the states
+       whose successors were recomputed, reused those whose edges were kept.'''
+    added_states: List[str]
+    removed_states: List[str]
+    added_edges: List[Tuple[str, str]]
+    removed_edges: List[Tuple[str, str]]
+    recomputed: int = 0
+    reused: int = 0
+
+def diff_entities(old: Entity, new: Entity) -> EntityDiff:
+    '''the relation changes from old to new. changing quantities, their spaces or
+       exogenous flags changes the state space itself.'''
+    quantities_changed = old.quantities != new.quantities or list(old.quantities) != list(new.quantities) or old.exogenous_dict != new.exogenous_dict
+    return EntityDiff(
+        added=tuple(r for r in new.relations if r not in old.relations),
+        removed=tuple(r for r in old.relations if r not in new.relations),
+        quantities_changed=quantities_changed,
+    )
+
+def affected(codec: StateCodec, diff: EntityDiff, old_codec: StateCodec) -> Callable[[int], bool]:
+    '''a conservative test of whether the successors of a packed state may differ
+       under the changed relations. successors stay within one magnitude step
+       of the state, so a changed relation is inert at a state if:
+       - influence: its source has magnitude sign 0 throughout that window;
+       - proportional: for every choice of successor magnitudes in the window
+         and of derivatives after influences, its target may take the same
+         derivatives under the old and the new proportionals. this only
+         involves the target, the proportional sources and their influence
+         sources, so it is checked per values of those and cached;
+       - value correspondence: its source value is outside the window.'''
+    position = {k: i for i, k in enumerate(codec.names)}
+    tables = codec.tables
+    influences = []
+    targets = set()
+    correspondences = []
+    for relation in (*diff.added, *diff.removed):
+        if isinstance(relation, Influence):
+            influences.append(position[relation.a.name])
+        elif isinstance(relation, Proportional):
+            targets.add(position[relation.b.name])
+        elif isinstance(relation, ValueCorrespondence):
+            (k, magnitude) = relation.a
+            correspondences.append((position[k], tables[position[k]].index[magnitude]))
+    # influences per target, across old and new relations. a changed influence
+    # that is inert contributes sign 0 either way.
+    sources = collections.defaultdict(set)
+    for c in (old_codec, codec):
+        for (qb, relations) in c.influences:
+            sources[qb].update(relations)
+    # per target of a changed proportional: its old and new proportionals, the
+    # quantities whose derivative after influences it depends on, and the
+    # quantities whose successor magnitudes those depend on
+    proportionals = []
+    for qb in sorted(targets):
+        (old, new) = (dict(old_codec.proportionals).get(qb, ()), dict(codec.proportionals).get(qb, ()))
+        influenced = sorted({qb, *(qa for (qa, _) in (*old, *new))})
+        magnitudes = sorted({*influenced, *(qs for q in influenced for (qs, _) in sources[q])})
+        proportionals.append((qb, old, new, influenced, magnitudes))
+    cache = {}
+
+    def window(q: int, idx: int) -> range:
+        return range(max(0, idx - 1), min(len(tables[q].signs), idx + 2))
+
+    def window_signed(qa: int, idx: int) -> bool:
+        return any(tables[qa].signs[i] for i in window(qa, idx))
+
+    def proportional_changed(qb: int, old: Tuple, new: Tuple, influenced: List[int], magnitudes: List[int], source: Tuple) -> bool:
+        for values in itertools.product(*(window(q, source[q][0]) for q in magnitudes)):
+            idx = dict(zip(magnitudes, values))
+            options = [
+                clip_signs(tables[q], idx[q], SIGN_MOVES[(source[q][1], combine_signs(correlation * tables[qs].signs[idx[qs]] for (qs, correlation) in sources[q]))])
+                for q in influenced]
+            for signs in itertools.product(*options):
+                sign = dict(zip(influenced, signs))
+                (before, after) = (combine_signs(correlation * sign[qa] for (qa, correlation) in relations) for relations in (old, new))
+                if clip_signs(tables[qb], idx[qb], SIGN_MOVES[(sign[qb], before)]) != clip_signs(tables[qb], idx[qb], SIGN_MOVES[(sign[qb], after)]):
+                    return True
+        return False
+
+    def test(code: int) -> bool:
+        source = unpack(codec, code)
+        if any(window_signed(qa, source[qa][0]) for qa in influences):
+            return True
+        for (qb, old, new, influenced, magnitudes) in proportionals:
+            key = (qb, tuple(source[q] for q in magnitudes))
+            if key not in cache:
+                cache[key] = proportional_changed(qb, old, new, influenced, magnitudes, source)
+            if cache[key]:
+                return True
+        return any(abs(source[qa][0] - va) <= 1 for (qa, va) in correspondences)
+    return test
+
+def reenvision(
+    sg: Union[StateGraph, Envisionment],
+    entity: Entity,
+    seeds: Optional[List[Union[str, EntityState]]] = None,
+    compat_keys: bool = True,
+    exogenous: bool = False) -> Tuple[Union[StateGraph, Envisionment], GraphPatch]:
+    '''re-envision a state graph or envisionment for a changed version of its
+       entity, e.g. with a relation swapped. the result holds the states
+       reachable from seeds (keys of sg or states of the new entity) under the
+       new relations, as gen_state_graph would give. seeds default to every
+       valid state of the new entity for an envisionment, as in
+       gen_full_envisionment, and otherwise to the first state of every source
+       component of sg, from which all of sg was reached. successors are only
+       recomputed for states found by `affected`; other states keep their
+       edges. surviving states keep their order, new states follow. entities
+       with other quantities, and truncated graphs (whose frontier states were
+       never expanded), are explored from scratch. exogenous is as in
+       gen_state_graph, and must be given for graphs explored with it; for a
+       graph without exogenous edges it recomputes every state, as its
+       successors may lack them.'''
+    env = sg if isinstance(sg, Envisionment) else None
+    if env is not None:
+        sg = env.graph
+    if sg.exogenous_edges and not exogenous:
+        raise ValueError('the graph has exogenous edges, re-envision it with exogenous=True')
+    codec = entity_codec(entity)
+    old_codec = entity_codec(sg.states[sg.keys[0]].entity) if sg.keys else codec
+    diff = diff_entities(old_codec.entity, entity)
+    if seeds is None and env is not None:
+        seeds = list(valid_packed_states(codec))
+    else:
+        if seeds is None:
+            cond = condensation(sg)
+            seeds = [sg.keys[v] for v in sorted(cond.members[c][0] for c in source_components(cond))]
+        if diff.quantities_changed and any(isinstance(seed, str) for seed in seeds):
+            raise ValueError('seeds must be states of the new entity when its quantities change')
+        seeds = [encode_state(EntityState(entity, (sg.states[seed] if isinstance(seed, str) else seed).state)) for seed in seeds]
+    old_successors = {}
+    old_exogenous = set()
+    if not diff.quantities_changed:
+        # same quantities, so packed codes carry over between the codecs
+        old_codes = [encode_state(sg.states[k]) for k in sg.keys]
+        old_successors = {code: [old_codes[i] for i in sg.successor_ids(a)] for a, code in enumerate(old_codes)}
+        old_exogenous = {(old_codes[a], old_codes[b]) for a, b in sg.exogenous_edges}
+        truncated = sg.stats is not None and sg.stats.truncated
+        endogenous_only = exogenous and not sg.exogenous_edges
+        is_affected = (lambda code: True) if truncated or endogenous_only else affected(codec, diff, old_codec)
+
+    patch = GraphPatch([], [], [], [])
+    successors = {}
+    exogenous_edges = set()
+    worklist = collections.deque(dict.fromkeys(seeds))
+    seen = set(worklist)
+    while worklist:
+        code = worklist.popleft()
+        if code in old_successors and not is_affected(code):
+            successors[code] = old_successors[code]
+            exogenous_edges.update((code, succ) for succ in successors[code] if (code, succ) in old_exogenous)
+            patch.reused += 1
+        elif exogenous:
+            transitions = next_packed_transitions(codec, code)
+            successors[code] = sorted(transitions)
+            exogenous_edges.update((code, succ) for succ, label in transitions.items() if label == EXOGENOUS)
+            patch.recomputed += 1
+        else:
+            successors[code] = sorted(next_packed_states(codec, code))
+            patch.recomputed += 1
+        for succ in successors[code]:
+            if succ not in seen:
+                seen.add(succ)
+                worklist.append(succ)
+
+    # surviving states in their old order, then new ones in discovery order
+    added = [code for code in successors if code not in old_successors]
+    nodes = [code for code in old_successors if code in successors] + added
+    edges = [(a, b) for a in nodes for b in successors[a]]
+    (new_sg, keys) = decode_graph(codec, nodes, edges, compat_keys=compat_keys, exogenous_edges=exogenous_edges)
+
+    old_keys = {code: k for code, k in zip(old_successors, sg.keys)}
+    patch.added_states = [keys[code] for code in added]
+    patch.removed_states = [old_keys[code] for code in old_successors if code not in successors]
+    for a in [*old_successors, *added]:
+        before = old_successors.get(a, [])
+        after = successors.get(a, [])
+        patch.removed_edges += [(old_keys[a], old_keys[b]) for b in before if b not in after]
+        patch.added_edges += [(keys[a], keys[b]) for b in after if b not in before]
+    if diff.quantities_changed:
+        patch.removed_states = list(sg.keys)
+        patch.removed_edges = list(sg.edges)
+    if env is not None:
+        seed_keys = [keys[code] for code in seeds]
+        return (Envisionment(new_sg, seed_keys, ReachSets(new_sg, seed_keys)), patch)
+    return (new_sg, patch)
@@ -0,0 +1,102 @@
+'''opt-in, size-bounded memoization of successor functions'''
+
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from qr_types import *
+
+import functools
+
+class TransitionMemo:
+    '''LRU cache of successor sets, keyed on (function, entity id, state key).
+       entries keep a reference to their entity so a recycled id never hits.'''
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Tuple[str, int, Hashable], entity: Entity) -> Optional[frozenset]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] is not entity:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Tuple[str, int, Hashable], entity: Entity, value: frozenset) -> None:
+        self.entries[key] = (entity, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, entity: Optional[Entity] = None) -> int:
+        '''drop the entries of an entity (or all of them), returning how many were dropped'''
+        if entity is None:
+            dropped = len(self.entries)
+            self.entries.clear()
+            return dropped
+        stale = [key for key, (owner, _) in self.entries.items() if owner is entity]
+        for key in stale:
+            del self.entries[key]
+        return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size': len(self.entries),
+            'maxsize': self.maxsize,
+        }
+
+# the active memo, or None while memoization is disabled (the default)
+MEMO: Optional[TransitionMemo] = None
+
+def enable_memo(maxsize: int = 100000) -> TransitionMemo:
+    '''start memoizing successor functions, dropping any previous memo'''
+    global MEMO
+    MEMO = TransitionMemo(maxsize)
+    return MEMO
+
+def disable_memo() -> None:
+    '''stop memoizing successor functions'''
+    global MEMO
+    MEMO = None
+
+def memo_stats() -> Optional[Dict[str, Any]]:
+    '''hit/miss statistics of the active memo, if any'''
+    return MEMO.stats() if MEMO is not None else None
+
+def invalidate_entity(entity: Entity) -> int:
+    '''call after changing an entity's quantities or relations: drops its memo
+       entries and packed codec, and recompiles its tables and relation index.'''
+    object.__setattr__(entity, 'codec', None)
+    compile_entity(entity)
+    return MEMO.invalidate(entity) if MEMO is not None else 0
+
+def memoized(key: Callable[..., Tuple[Entity, Hashable]]) -> Callable:
+    '''decorate a successor function returning a set to use the active memo.
+       key maps the call arguments to (entity, state key).'''
+    def decorate(fn: Callable) -> Callable:
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            memo = MEMO
+            if memo is None:
+                return fn(*args)
+            (entity, k) = key(*args)
+            full_key = (name, id(entity), k)
+            cached = memo.get(full_key, entity)
+            if cached is None:
+                cached = frozenset(fn(*args))
+                memo.put(full_key, entity, cached)
+            return set(cached)
+        return wrapper
+    return decorate
@@ -13,7 +13,7 @@ container_state = {
 bonus_container_state = {
     **container_state,
     'height': (Height.ZERO, Direction.NEUTRAL),
-    'pressure': (Volume.ZERO, Direction.NEUTRAL),
+    'pressure': (Pressure.ZERO, Direction.NEUTRAL),
 }
 
 entity_state = make_entity_state(container, container_state)
@@ -0,0 +1,98 @@
+'''compact integer encoding of entity states'''
+
+from enum import Enum
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+from qr_types import *
+
+# derivative codes: the sign of a derivative shifted to be non-negative.
+# QUESTION never occurs in a state, only as a combined relation effect.
+DERIVATIVES = (Direction.NEGATIVE, Direction.NEUTRAL, Direction.POSITIVE)
+DERIVATIVE_CODES = {Direction.NEGATIVE: 0, Direction.NEUTRAL: 1, Direction.POSITIVE: 2}
+
+@dataclass(frozen=True)
+class StateCodec:
+    '''packs an entity state into a single int. each quantity, in the fixed
+       order of the entity's quantities, takes a bit field holding the pair
+       code `magnitude index * 3 + derivative code`.'''
+    entity: Entity
+    names: Tuple[str, ...]
+    tables: Tuple[SpaceTable, ...]
+    shifts: Tuple[int, ...]
+    masks: Tuple[int, ...]
+    # relation index by position: (target, ((source, correlation sign), ...)) per
+    # influenced/proportional target, and value correspondences by (position, index)
+    influences: Tuple[Tuple[int, Tuple[Tuple[int, int], ...]], ...]
+    proportionals: Tuple[Tuple[int, Tuple[Tuple[int, int], ...]], ...]
+    correspondences: Dict[Tuple[int, int], Tuple[Tuple[int, int], ...]]
+    # the order of successor generation, filled in by prune.successor_plan
+    plan: Optional['SuccessorPlan'] = field(default=None, compare=False, repr=False)
+
+def make_codec(entity: Entity) -> StateCodec:
+    '''lay out the bit fields for the quantities of an entity'''
+    names = tuple(entity.quantities)
+    tables = tuple(entity_tables(entity)[k] for k in names)
+    widths = [max(1, (len(table.members) * 3 - 1).bit_length()) for table in tables]
+    shifts = tuple(sum(widths[:i]) for i in range(len(widths)))
+    masks = tuple((1 << width) - 1 for width in widths)
+    index = entity_relations(entity)
+    position = {k: i for i, k in enumerate(names)}
+
+    def by_target(grouped: Dict[str, List[Relationship]]) -> Tuple[Tuple[int, Tuple[Tuple[int, int], ...]], ...]:
+        return tuple(
+            (position[k], tuple((position[relation.a.name], DERIVATIVE_CODES[relation.correlation] - 1) for relation in relations))
+            for k, relations in grouped.items())
+
+    def value_position(k: str, magnitude: Enum) -> Tuple[int, int]:
+        return (position[k], tables[position[k]].index[magnitude])
+
+    correspondences = {
+        value_position(*a): tuple(value_position(*relation.b) for relation in relations)
+        for a, relations in index.correspondences.items()
+    }
+    return StateCodec(entity, names, tables, shifts, masks, by_target(index.influences), by_target(index.proportionals), correspondences)
+
+def entity_codec(entity: Entity) -> StateCodec:
+    '''get the codec of an entity, making it on first use'''
+    if entity.codec is None:
+        object.__setattr__(entity, 'codec', make_codec(entity))
+    return entity.codec
+
+def pack(codec: StateCodec, pairs: Tuple[Tuple[int, int], ...]) -> int:
+    '''pack (magnitude index, derivative sign) pairs, in codec order, into an int'''
+    code = 0
+    for shift, (idx, sign) in zip(codec.shifts, pairs):
+        code |= (idx * 3 + sign + 1) << shift
+    return code
+
+def unpack(codec: StateCodec, code: int) -> Tuple[Tuple[int, int], ...]:
+    '''unpack an int into (magnitude index, derivative sign) pairs in codec order'''
+    pairs = []
+    for shift, mask in zip(codec.shifts, codec.masks):
+        (idx, der) = divmod((code >> shift) & mask, 3)
+        pairs.append((idx, der - 1))
+    return tuple(pairs)
+
+def encode_state(entity_state: EntityState) -> int:
+    '''pack an EntityState into an int. raises ValueError for states missing a
+       quantity or holding a magnitude outside its quantity space.'''
+    codec = entity_codec(entity_state.entity)
+    state = entity_state.state
+    code = 0
+    for k, table, shift in zip(codec.names, codec.tables, codec.shifts):
+        pair = state.get(k)
+        if pair is None:
+            raise ValueError(f"state of {codec.entity.name} has no quantity {k}")
+        idx = table.index.get(pair.magnitude)
+        if idx is None:
+            raise ValueError(f"{pair.magnitude} is not in the quantity space of {k} ({', '.join(str(m) for m in table.members)})")
+        code |= (idx * 3 + DERIVATIVE_CODES[pair.derivative]) << shift
+    return code
+
+def decode_state(codec: StateCodec, code: int) -> EntityState:
+    '''unpack an int back into an EntityState'''
+    state = {}
+    for k, table, shift, mask in zip(codec.names, codec.tables, codec.shifts, codec.masks):
+        (idx, der) = divmod((code >> shift) & mask, 3)
+        state[k] = QuantityPair(table.members[idx], DERIVATIVES[der])
+    return EntityState(codec.entity, state)
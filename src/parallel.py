@@ -0,0 +1,18 @@
+'''worker side of parallel state graph exploration'''
+
+from typing import List, Optional, Tuple
+from qr_types import *
+from packed import *
+from prune import next_packed_states
+
+# the codec of the entity a worker process explores, set once by init_worker
+CODEC: Optional[StateCodec] = None
+
+def init_worker(entity: Entity) -> None:
+    '''process pool initializer: receive the entity once per worker rather than per task'''
+    global CODEC
+    CODEC = entity_codec(entity)
+
+def expand_batch(codes: List[int]) -> List[Tuple[int, ...]]:
+    '''the successors of a batch of packed states, sorted so merging is deterministic'''
+    return [tuple(sorted(next_packed_states(CODEC, code))) for code in codes]
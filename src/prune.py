@@ -1,10 +1,19 @@
 # Importing the Libraries
 import copy
-from typing import List, Dict, Tuple, Set
+from typing import List, Dict, Tuple, Set, Optional, Iterable, Iterator
+from dataclasses import dataclass
 import itertools
 from frozen import FrozenDict
 from qr_types import *
+from packed import *
+from memo import memoized
+from batch import transition_mask, derivative_candidates, continuous_mask, point_range_mask, not_equal_mask
+from instrument import profiled
 
+import instrument
+
+@profiled
+@memoized(lambda entity_state: (entity_state.entity, canonical_key(entity_state)))
 def next_states(entity_state: EntityState) -> Set[EntityState]:
     entity = entity_state.entity
     state = entity_state.state
@@ -13,39 +22,69 @@ def next_states(entity_state: EntityState) -> Set[EntityState]:
     new_states = set([b for a in tmp_entity_states for b in derivative_states(a, entity_state)])
     return new_states
 
+@profiled
+@memoized(lambda a, entity_state: (a.entity, (canonical_key(a), canonical_key(entity_state))))
 def derivative_states(a: EntityState, entity_state: EntityState) -> Set[EntityState]:
     all_directions = {Direction.POSITIVE, Direction.NEUTRAL, Direction.NEGATIVE}
-    options = set()
-    relations = a.entity.relations
+    candidates = set()
     # options based on influence relations
-    influence_effects = relation_effects(a.state, relations, True)
+    influence_effects = entity_effects(a.entity, a.state, True)
     for deriv_dict_direct in next_derivatives(a, influence_effects):
         state1 = {k: QuantityPair(a.state[k].magnitude, derivative) for k, derivative in deriv_dict_direct.items()}
         b1 = EntityState(a.entity, state1)
         # options based on proportionality relations
-        proportionality_effects = relation_effects(b1.state, relations, False)
+        proportionality_effects = entity_effects(a.entity, b1.state, False)
         for deriv_dict_indirect in next_derivatives(b1, proportionality_effects):
-            state2 = {k: QuantityPair(a.state[k].magnitude, derivative) for k, derivative in deriv_dict_indirect.items()}
-            b2 = EntityState(a.entity, state2)
-
-            if check_transition(entity_state, b2):
-                options.add(b2)
-
-            # # options based on exogenous actions
-            # exogenous_effects = {k: all_directions if is_exogenous else {Direction.NEUTRAL} for k, is_exogenous in a.entity.exogenous_dict.items()}
-            # for deriv_dict_exogenous in next_derivatives(b2, exogenous_effects):
-            #     state3 = {k: QuantityPair(a.state[k].magnitude, derivative) for k, derivative in deriv_dict_exogenous.items()}
-            #     b3 = EntityState(a.entity, state3)
-            #     if check_transition(a, b3):
-            #         # TODO: somehow mark the edge as exogenously influnced?
-            #         options.add(b3)
-    return options
+            candidates.add(deriv_dict_indirect)
+            # exogenous actions are applied on packed states, see next_packed_transitions
+    candidates = list(candidates)
+    valid = check_derivative_transitions(entity_state, a, candidates)
+    profile = instrument.PROFILE
+    if profile is not None:
+        profile.count('derivative_states.candidates', len(candidates))
+        profile.count('derivative_states.pruned.transition', valid.count(False))
+    return {
+        EntityState(a.entity, {k: QuantityPair(a.state[k].magnitude, derivative) for k, derivative in deriv_dict.items()})
+        for deriv_dict, is_valid in zip(candidates, valid) if is_valid
+    }
+
+# from this many candidates on, they are validated with numpy in one go.
+# measured on the bench.py entities: at 4 candidates both ways take ~95us,
+# at 5 numpy is ahead (103us against 117us) and the gap widens with more
+BATCH_THRESHOLD = 5
+
+@profiled
+def check_derivative_transitions(entity_state: EntityState, a: EntityState, candidates: List[Dict[str, Direction]]) -> List[bool]:
+    '''check_transition from entity_state to each candidate set of derivatives on
+       the magnitudes of a. large batches are checked at once by batch.transition_mask.'''
+    profile = instrument.PROFILE
+    if len(candidates) < BATCH_THRESHOLD:
+        states = [EntityState(a.entity, {k: QuantityPair(a.state[k].magnitude, derivative) for k, derivative in deriv_dict.items()}) for deriv_dict in candidates]
+        if profile is not None:
+            profile.count('check_transition.candidates', len(states))
+            for b in states:
+                # the rule that rejects a state first, as check_transition short-circuits
+                rule = 'continuous' if not check_continuous(entity_state, b) else 'point_range' if not check_point_range(entity_state, b) else 'not_equal' if not check_not_equal(entity_state, b) else None
+                if rule is not None:
+                    profile.count(f"check_transition.pruned.{rule}")
+        return [check_transition(entity_state, b) for b in states]
+    codec = entity_codec(a.entity)
+    matrix = derivative_candidates(codec, a, candidates)
+    if profile is not None:
+        profile.count('check_transition.candidates', len(candidates))
+        continuous = continuous_mask(codec, entity_state, matrix)
+        point_range = continuous & point_range_mask(codec, entity_state, matrix)
+        profile.count('check_transition.pruned.continuous', int((~continuous).sum()))
+        profile.count('check_transition.pruned.point_range', int((continuous & ~point_range).sum()))
+        profile.count('check_transition.pruned.not_equal', int((point_range & ~not_equal_mask(codec, entity_state, matrix)).sum()))
+    return list(transition_mask(codec, entity_state, matrix))
 
 def zip_pair(tpl: Tuple[Dict[str, Enum], Dict[str, Direction]]) -> Dict[str, QuantityPair]:
     (magnitude_dict, derivative_dict) = tpl
     return {k: QuantityPair(magnitude, derivative_dict[k]) for k, magnitude in magnitude_dict.items()}
 
 # TODO: incorporate transformation based on check_extremes
+@profiled
 def next_derivatives(entity_state: EntityState, effect_sets: Dict[str, Direction]) -> Set[Dict[str, Direction]]:
     state =     entity_state.state
     entity =    entity_state.entity
@@ -88,17 +127,15 @@ def clip_extremes(qty: Quantity, pair: QuantityPair) -> Direction:
 def extreme_direction(magnitude: Enum, enum: EnumMeta) -> Direction:
     '''get a direction from a magnitude based on whether it is at the
        high extreme (positive), low (negative), or in between (neutral).'''
-    val = magnitude.value
-    vals = [mag.value for mag in dict(enum.__members__).values()]
-    return Direction.NEGATIVE if val == min(vals) else \
-           Direction.POSITIVE if val == max(vals) else \
-           Direction.NEUTRAL
+    table = space_table(enum)
+    return table.extremes[table.index[magnitude]]
 
 def move_derivative(derivative: Direction, effect: Direction) -> Set[Direction]:
     return {Direction.NEUTRAL} if {derivative, effect} == {Direction.POSITIVE, Direction.NEGATIVE} else \
         set([derivative]).union(move_derivative(derivative, Direction.POSITIVE)).union(move_derivative(derivative, Direction.NEGATIVE)) if effect == Direction.QUESTION else \
         {effect} if derivative == Direction.NEUTRAL else {derivative}
 
+@profiled
 def next_magnitudes(entity_state: EntityState) -> Set[Dict[str, Enum]]:
     state = entity_state.state
     entity = entity_state.entity
@@ -107,17 +144,23 @@ def next_magnitudes(entity_state: EntityState) -> Set[Dict[str, Enum]]:
         list(map(lambda x: (k, x), magnitude_options(pair, entity.quantities[k].quantitySpace)))
         for k, pair in state.items()
     }
-    magnitude_combinations = set(map(lambda pairs: handle_correspondence(pairs, entity_state), itertools.product(*magnitudes.values())))
-    return magnitude_combinations
-
-def handle_correspondence(magnitudes: List[Tuple[str, Enum]], entity_state: EntityState) -> Dict[str, Enum]:
+    combinations = list(map(lambda pairs: handle_correspondence(pairs, entity_state), itertools.product(*magnitudes.values())))
+    profile = instrument.PROFILE
+    if profile is not None:
+        profile.count('next_magnitudes.candidates', len(combinations))
+        profile.count('next_magnitudes.pruned.correspondence', combinations.count(None))
+    # combinations with clashing requirements are dropped
+    return set(combinations) - {None}
+
+@profiled
+def handle_correspondence(magnitudes: List[Tuple[str, Enum]], entity_state: EntityState) -> Optional[Dict[str, Enum]]:
     # get value correspondence requirements per quantity
     state = {k: QuantityPair(magnitude, entity_state.state[k].derivative) for k, magnitude in magnitudes}
     entity_state_ = EntityState(entity_state.entity, state)
     reqs = correspondence_reqs(entity_state_)
     has_clashes = max(map(len, reqs.values())) > 1
     if has_clashes:
-        return set()
+        return None
     # forcing approach: force the quantity to the value in spite of its derivative and point/range priorities
     state_ = {k: list(req)[0] if req else entity_state_.state[k].magnitude for k, req in reqs.items()}
     return FrozenDict(state_)
@@ -130,21 +173,22 @@ def magnitude_options(pair: QuantityPair, space: EnumMeta) -> Set[Enum]:
 
 def correspondence_reqs(entity_state: EntityState) -> Dict[str, Set[Enum]]:
     '''get a dictionary of value correspondence requirements on quantities'''
-    entity = entity_state.entity
+    index = entity_relations(entity_state.entity)
     state = entity_state.state
     reqs = {k: set() for k in state}
-    for relation in entity.relations:
-        if type(relation) == ValueCorrespondence and qty_matches(state, relation.a):
-            (k, magnitude) = relation.b
-            reqs[k].add(magnitude)
+    for k, pair in state.items():
+        for relation in index.correspondences.get((k, pair.magnitude), ()):
+            (k_b, magnitude) = relation.b
+            reqs[k_b].add(magnitude)
     return reqs
 
 def move_magnitude(pair: QuantityPair, space: EnumMeta) -> Enum:
     '''move a magnitude based on its derivative'''
-    members = list(space.__members__)
-    idx = {k: i for i, k in list(enumerate(members))}[pair.magnitude.name]
-    new_idx = min(len(members)-1, max(0, idx + to_sign(pair.derivative)))
-    return space[members[new_idx]]
+    table = space_table(space)
+    idx = table.index[pair.magnitude]
+    sign = to_sign(pair.derivative)
+    new_idx = table.nexts[idx] if sign > 0 else table.prevs[idx] if sign < 0 else idx
+    return table.members[new_idx]
 
 def relation_effects(state: Dict[str, QuantityPair], relations: List[Relation], is_direct: bool) -> Dict[str, Set[Direction]]:
     '''for each quantity in a state find the effects of the relationships working on that quantity'''
@@ -162,6 +206,21 @@ def relation_effects(state: Dict[str, QuantityPair], relations: List[Relation],
             )
     return target_quantities
 
+def entity_effects(entity: Entity, state: Dict[str, QuantityPair], is_direct: bool) -> Dict[str, Set[Direction]]:
+    '''relation_effects for the relations of an entity, using its relation index'''
+    index = entity_relations(entity)
+    target_quantities = {k: set() for k in state}
+    for target_k, relations in (index.influences if is_direct else index.proportionals).items():
+        effects = target_quantities[target_k]
+        for relation in relations:
+            qty1 = state[relation.a.name]
+            effects.add(
+                direct_influence(relation.correlation, qty1.magnitude.value)
+                if is_direct else
+                indirect_influence(relation.correlation, qty1.derivative)
+            )
+    return target_quantities
+
 def combine_derivatives(directions_: Set[Direction]) -> Direction:
     '''obtain a Direction by combining a set of them. this may give Direction.QUESTION.'''
     directions = directions_ - {Direction.NEUTRAL}
@@ -206,16 +265,15 @@ def to_sign(direction: Enum) -> int:
 
 def check_continuous(stateA: EntityState, stateB: EntityState) -> bool:
     '''check that two states' magnitudes/derivatives aren't too far apart'''
-    quantities = stateA.entity.quantities
-    qty_keys = quantities.keys()
-    for k in qty_keys:
+    tables = entity_tables(stateA.entity)
+    for k, table in tables.items():
         a_pair = stateA.state[k]
         b_pair = stateB.state[k]
         # derivatives are OK iff the same or either is neutral, leaving positive/negative the only bad combo
         if {a_pair.derivative, b_pair.derivative} == {Direction.NEGATIVE, Direction.POSITIVE}:
             return False
         # magnitudes are OK if equal or subsequent (in either direction)
-        index = {v:k for k,v in enumerate(quantities[k].quantitySpace.__members__.values())}
+        index = table.index
         if abs(index[a_pair.magnitude] - index[b_pair.magnitude]) > 1:
             return False
     return True
@@ -243,10 +301,15 @@ def is_point(magnitude: Enum) -> bool:
 def check_value_correspondence(entity_state: EntityState) -> bool:
     '''check if a state is deemed valid by its value correspondence rules'''
     state = entity_state.state
-    entity = entity_state.entity
-    for relation in entity.relations:
-        if type(relation) == ValueCorrespondence:
-            if not qty_matches(state, relation.a) == qty_matches(state, relation.b):
+    index = entity_relations(entity_state.entity)
+    # a correspondence only fails if one of its sides holds, so only visit those
+    for k, pair in state.items():
+        value = (k, pair.magnitude)
+        for relation in index.correspondences.get(value, ()):
+            if not qty_matches(state, relation.b):
+                return False
+        for relation in index.correspondents.get(value, ()):
+            if not qty_matches(state, relation.a):
                 return False
     return True
 
@@ -257,12 +320,12 @@ def compare_derivatives(old: Direction, new: Direction) -> Direction:
 def check_extremes(entity_state: EntityState) -> bool:
     '''ensure derivatives are clipped when the magnitudes are at an extreme point'''
     state = entity_state.state
-    quantities = entity_state.entity.quantities
+    tables = entity_tables(entity_state.entity)
     for k, pair in state.items():
         mag = pair.magnitude
         der = pair.derivative
-        enum = quantities[k].quantitySpace
-        side = extreme_direction(mag, enum)
+        table = tables[k]
+        side = table.extremes[table.index[mag]]
         if is_point(mag) and der == side and der != Direction.NEUTRAL:
             return False
     return True
@@ -272,11 +335,10 @@ def derivatives_match(a: EntityState, b: EntityState) -> bool:
     # state1: Dict[str, QuantityPair], state2: Dict[str, QuantityPair], relations: List[Relation]
     state1 = a.state
     state2 = b.state
-    relations = a.entity.relations
     derivatives1 = state_derivatives(state1)
     derivatives2 = state_derivatives(state2)
     # Dictionary to keep track of the derivative directions of dependant quantities
-    effect_sets = relation_effects(state1, relations, True)  # TODO: add False
+    effect_sets = entity_effects(a.entity, state1, True)  # TODO: add False
     # Determine the overall derivative direction for the target quantities
     relation_derivatives = {k: combine_derivatives(directions) for k, directions in effect_sets.items()}
     # check if state2 derivatives are compatible with relation_derivatives:
@@ -323,6 +385,253 @@ def check_not_equal(stateA: EntityState, stateB: EntityState) -> bool:
     '''confirm two states are distinct'''
     return stateA != stateB
 
+@profiled
 def check_transition(a: EntityState, b: EntityState) -> bool:
     '''confirm a source state can transition into a target state'''
     return check_continuous(a, b) and check_point_range(a, b) and check_not_equal(a, b)
+
+# packed-state successor generation: the rules above, applied to the
+# (magnitude index, derivative sign) pairs of states encoded by packed.py.
+
+QUESTION = None  # sign stand-in for Direction.QUESTION
+
+SIGN_MOVES = {
+    (sign, effect): tuple(sorted(to_sign(d) for d in move_derivative(num_to_direction(sign), Direction.QUESTION if effect is QUESTION else num_to_direction(effect))))
+    for sign in (-1, 0, 1) for effect in (-1, 0, 1, QUESTION)
+}
+
+@dataclass(frozen=True)
+class SuccessorPlan:
+    '''the order in which next_packed_states settles quantities. quantity positions
+       are assigned in codec order; once a quantity and everything it depends on
+       are assigned, it is settled and its constraints are checked right away.'''
+    forcing: Tuple[Tuple[Tuple[int, int, int], ...], ...]   # per target: (source, source index, forced index)
+    magnitudes_settled: Tuple[Tuple[int, ...], ...]        # targets settled after choosing position t
+    derivatives_settled: Tuple[Tuple[int, ...], ...]       # targets settled after assigning position t
+    influences: Tuple[Tuple[Tuple[int, int], ...], ...]    # per target: (source, correlation sign)
+    proportionals: Tuple[Tuple[Tuple[int, int], ...], ...] # per target: (source, correlation sign)
+    exogenous: Tuple[int, ...]                             # quantities with exogenous changes
+
+def successor_plan(codec: StateCodec) -> SuccessorPlan:
+    '''get the successor plan of a codec, making it on first use'''
+    plan = codec.plan
+    if plan is None:
+        n = len(codec.names)
+        forcing = [[] for _ in range(n)]
+        for (qa, va), targets in codec.correspondences.items():
+            for (qb, vb) in targets:
+                forcing[qb].append((qa, va, vb))
+        influences = [()] * n
+        for (qb, sources) in codec.influences:
+            influences[qb] = sources
+        proportionals = [()] * n
+        for (qb, sources) in codec.proportionals:
+            proportionals[qb] = sources
+
+        def settled(dependencies: List[Iterable[int]]) -> Tuple[Tuple[int, ...], ...]:
+            when = [max([i, *deps]) for i, deps in enumerate(dependencies)]
+            return tuple(tuple(i for i in range(n) if when[i] == t) for t in range(n))
+
+        plan = SuccessorPlan(
+            forcing=tuple(map(tuple, forcing)),
+            magnitudes_settled=settled([[qa for (qa, _, _) in reqs] for reqs in forcing]),
+            derivatives_settled=settled([[qa for (qa, _) in sources] for sources in proportionals]),
+            influences=tuple(influences),
+            proportionals=tuple(proportionals),
+            exogenous=tuple(i for i, k in enumerate(codec.names) if codec.entity.exogenous_dict.get(k)),
+        )
+        object.__setattr__(codec, 'plan', plan)
+    return plan
+
+# the kinds of magnitude change of a move, as bits: some quantity leaves a
+# point, some quantity leaves a range. a valid move never has both.
+POINT_CHANGED = 1
+RANGE_CHANGED = 2
+
+@profiled
+@memoized(lambda codec, code: (codec.entity, code))
+def next_packed_states(codec: StateCodec, code: int) -> Set[int]:
+    '''next_states for a packed state, yielding packed states: the moves of
+       packed_moves that change the state.'''
+    options = set()
+    profile = instrument.PROFILE
+    for target in packed_moves(codec, code):
+        if target != code:
+            options.add(target)
+        elif profile is not None:
+            profile.count('packed_derivatives.pruned.not_equal')
+    return options
+
+@profiled
+def packed_moves(codec: StateCodec, code: int) -> Dict[int, int]:
+    '''the candidate successors of a packed state passing every transition rule
+       but check_not_equal, so the state itself may be among them, each with
+       its kind of magnitude change (POINT_CHANGED / RANGE_CHANGED bits).
+       rather than filtering the product of all options, this enumerates by
+       backtracking: value correspondences, continuity and point-before-range
+       are checked for each quantity as soon as it is settled, pruning partial
+       assignments.'''
+    plan = successor_plan(codec)
+    tables = codec.tables
+    source = unpack(codec, code)
+    n = len(source)
+    options = {}
+    profile = instrument.PROFILE
+    # magnitude choices: a step along the derivative, or staying put for ranges
+    choice_options = []
+    for table, (idx, sign) in zip(tables, source):
+        moved = table.nexts[idx] if sign > 0 else table.prevs[idx] if sign < 0 else idx
+        choice_options.append((moved,) if table.points[idx] or moved == idx else (moved, idx))
+    choices = [0] * n
+    magnitudes = [0] * n
+    derivatives1 = [0] * n
+    derivative_options = [()] * n
+
+    def choose_magnitude(t: int, point_changed: bool, range_changed: bool) -> None:
+        if t == n:
+            choose_derivatives(POINT_CHANGED * point_changed | RANGE_CHANGED * range_changed)
+            return
+        if profile is not None:
+            profile.count('packed_magnitudes.candidates', len(choice_options[t]))
+        for choice in choice_options[t]:
+            choices[t] = choice
+            (point_changed_, range_changed_) = (point_changed, range_changed)
+            valid = True
+            for qb in plan.magnitudes_settled[t]:
+                # handle_correspondence: force targets of corresponding choices
+                reqs = {vb for (qa, va, vb) in plan.forcing[qb] if choices[qa] == va}
+                if len(reqs) > 1:
+                    valid = False
+                    rule = 'correspondence'
+                    break
+                magnitude = reqs.pop() if reqs else choices[qb]
+                before = source[qb][0]
+                # check_continuous / check_point_range on this quantity's magnitude
+                if abs(magnitude - before) > 1:
+                    valid = False
+                    rule = 'continuous'
+                    break
+                if magnitude != before:
+                    if tables[qb].points[before]:
+                        point_changed_ = True
+                    else:
+                        range_changed_ = True
+                    if point_changed_ and range_changed_:
+                        valid = False
+                        rule = 'point_range'
+                        break
+                magnitudes[qb] = magnitude
+            if valid:
+                choose_magnitude(t + 1, point_changed_, range_changed_)
+            elif profile is not None:
+                profile.count(f"packed_magnitudes.pruned.{rule}")
+
+    def choose_derivatives(kind: int) -> None:
+        # influences only depend on the (now known) magnitudes
+        direct_options = []
+        for qb in range(n):
+            effect = combine_signs(correlation * tables[qa].signs[magnitudes[qa]] for (qa, correlation) in plan.influences[qb])
+            direct_options.append(clip_signs(tables[qb], magnitudes[qb], SIGN_MOVES[(source[qb][1], effect)]))
+        choose_derivative(0, direct_options, kind)
+
+    def choose_derivative(t: int, direct_options: List[Tuple[int, ...]], kind: int) -> None:
+        if t == n:
+            for derivatives2 in itertools.product(*derivative_options):
+                options[pack(codec, tuple(zip(magnitudes, derivatives2)))] = kind
+            return
+        if profile is not None:
+            profile.count('packed_derivatives.candidates', len(direct_options[t]))
+        for derivative in direct_options[t]:
+            derivatives1[t] = derivative
+            valid = True
+            for qb in plan.derivatives_settled[t]:
+                # proportionalities work on the influenced derivatives
+                effect = combine_signs(correlation * derivatives1[qa] for (qa, correlation) in plan.proportionals[qb])
+                sign = source[qb][1]
+                # check_continuous: derivatives may not flip sign
+                derivative_options[qb] = tuple(
+                    option for option in clip_signs(tables[qb], magnitudes[qb], SIGN_MOVES[(derivatives1[qb], effect)])
+                    if option * sign != -1)
+                if not derivative_options[qb]:
+                    valid = False
+                    break
+            if valid:
+                choose_derivative(t + 1, direct_options, kind)
+            elif profile is not None:
+                profile.count('packed_derivatives.pruned.continuous')
+
+    choose_magnitude(0, False, False)
+    return options
+
+@profiled
+def next_packed_transitions(codec: StateCodec, code: int) -> Dict[int, str]:
+    '''next_packed_states plus exogenous changes, each successor labelled
+       ENDOGENOUS or EXOGENOUS. an exogenous quantity's derivative may step
+       once more up or down (e.g. inflow ramping) on any move of packed_moves,
+       the state itself included, so its candidates are reused rather than
+       rerunning the influences and proportionalities per variant. magnitudes
+       are untouched; the derivatives are still clipped at extremes and may
+       not flip sign.'''
+    plan = successor_plan(codec)
+    moves = packed_moves(codec, code)
+    transitions = {target: ENDOGENOUS for target in moves if target != code}
+    if not plan.exogenous:
+        return transitions
+    profile = instrument.PROFILE
+    source = unpack(codec, code)
+    cleared = ~sum(codec.masks[q] << codec.shifts[q] for q in plan.exogenous)
+    for target in moves:
+        pairs = unpack(codec, target)
+        variants = []
+        for q in plan.exogenous:
+            (idx, sign) = pairs[q]
+            variants.append([
+                (idx * 3 + option + 1) << codec.shifts[q]
+                for option in clip_signs(codec.tables[q], idx, SIGN_MOVES[(sign, QUESTION)])
+                if option * source[q][1] != -1])
+        for fields in itertools.product(*variants):
+            variant = target & cleared | sum(fields)
+            if variant != code and variant not in transitions:
+                transitions[variant] = EXOGENOUS
+                if profile is not None:
+                    profile.count('exogenous.transitions')
+    return transitions
+
+def valid_packed_states(codec: StateCodec) -> Iterator[int]:
+    '''enumerate the packed states passing state_valid, by backtracking over the
+       quantities: extremes are filtered per quantity, value correspondences as
+       soon as both of their quantities are assigned.'''
+    tables = codec.tables
+    n = len(tables)
+    checks = [[] for _ in range(n)]
+    for (qa, va), targets in codec.correspondences.items():
+        for (qb, vb) in targets:
+            checks[max(qa, qb)].append((qa, va, qb, vb))
+    # check_extremes: no derivative pushing a point magnitude off its edge
+    options = [
+        [(idx, sign) for idx in range(len(table.members)) for sign in (-1, 0, 1) if not (table.clip_signs[idx] and sign == table.clip_signs[idx])]
+        for table in tables
+    ]
+    pairs = [(0, 0)] * n
+
+    def assign(t: int) -> Iterator[int]:
+        if t == n:
+            yield pack(codec, tuple(pairs))
+            return
+        for pair in options[t]:
+            pairs[t] = pair
+            # check_value_correspondence: either both sides hold or neither does
+            if all((pairs[qa][0] == va) == (pairs[qb][0] == vb) for (qa, va, qb, vb) in checks[t]):
+                yield from assign(t + 1)
+
+    return assign(0)
+
+def combine_signs(signs: Iterable[int]) -> Optional[int]:
+    '''combine_derivatives on signs, giving QUESTION on disagreement'''
+    nonzero = set(signs) - {0}
+    return 0 if not nonzero else next(iter(nonzero)) if len(nonzero) == 1 else QUESTION
+
+def clip_signs(table: SpaceTable, idx: int, signs: Tuple[int, ...]) -> Tuple[int, ...]:
+    '''clip_extremes on derivative signs for a magnitude index'''
+    side = table.clip_signs[idx]
+    return tuple(sorted({0 if sign == side else sign for sign in signs})) if side else signs
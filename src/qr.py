@@ -1,48 +1,347 @@
 '''qualitative reasoning'''
 
 from enum import Enum, EnumMeta
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional, Callable, Iterable, Iterator, Hashable, Set, Sized
 from qr_types import *
 
 import yaml
 import itertools
+import functools
+import collections
+import concurrent.futures
+import time
+import parallel
+import instrument
 from prune import *
+from packed import *
+from analysis import ReachSets
 
 def make_entity(name: str, quantities: List[Quantity], relations: List[Relationship], exogenous_dict: Dict[str, bool]) -> Entity:
     '''wrap the entity ctor to handle Quantity dict creation'''
     qty_dict = {qty.name: qty for qty in quantities}
-    return Entity(name, qty_dict, relations, exogenous_dict)
+    return compile_entity(Entity(name, qty_dict, relations, exogenous_dict))
 
 def make_entity_state(entity: Entity, state_dict: Dict[str, Tuple[Enum, Direction]]) -> EntityState:
     '''wrap the EntityState ctor to handle state dict creation'''
     pair_state = {k: QuantityPair(*tpl) for k, tpl in state_dict.items()}
     return EntityState(entity, pair_state)
 
-def gen_state_graph(entity_state: EntityState) -> StateGraph:
+def gen_state_graph(
+    entity_state: EntityState,
+    order: str = 'dfs',
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None,
+    progress_every: int = 1000,
+    compat_keys: bool = True,
+    workers: int = 1,
+    batch_size: int = 256,
+    exogenous: bool = False) -> StateGraph:
+    '''explore the states reachable from a state using an explicit worklist.
+       order is 'dfs' (same node order as the former recursive version) or 'bfs'.
+       states deeper than max_depth are kept but not expanded; once max_states
+       states are known, edges into new states are dropped. both mark the
+       result as truncated. progress is called every progress_every expansions.
+       compat_keys picks the state_key format used for the graph's node keys.
+       with workers > 1, frontier states are expanded in batches of batch_size
+       across a process pool (see explore_parallel). that is breadth-first
+       only, so order must be 'bfs', and the result then equals the serial one.
+       with exogenous, the derivatives of exogenous quantities may also change
+       on their own (see next_packed_transitions); the graph's exogenous_edges
+       then holds the edges only those changes give.'''
+    check_parallel_order(order, workers)
+    codec = entity_codec(entity_state.entity)
+    seeds = [encode_state(entity_state)]
+    exogenous_edges = set()
+    # explore on packed states, only decoding them into the resulting graph
+    if exogenous:
+        if workers > 1:
+            raise ValueError('exogenous exploration runs in a single process')
+        (nodes, edges, stats) = explore_packed(codec, seeds, order, max_depth, max_states, progress, progress_every, exogenous_expand(codec, exogenous_edges))
+    elif workers > 1:
+        (nodes, edges, stats) = explore_parallel(codec, seeds, workers, batch_size, max_depth, max_states, progress)
+    else:
+        (nodes, edges, stats) = explore_packed(codec, seeds, order, max_depth, max_states, progress, progress_every)
+    (sg, _) = decode_graph(codec, nodes, edges, stats, compat_keys, exogenous_edges)
+    if instrument.PROFILE is not None:
+        stats.profile = instrument.profile_summary()
+    return sg
+
+def exogenous_expand(codec: StateCodec, exogenous_edges: Set[Tuple[int, int]]) -> Callable[[int], Iterable[int]]:
+    '''an expand function for iter_packed giving next_packed_transitions,
+       adding the exogenous edges found to exogenous_edges as code pairs'''
+    def expand(code: int) -> Iterable[int]:
+        transitions = next_packed_transitions(codec, code)
+        exogenous_edges.update((code, target) for target, label in transitions.items() if label == EXOGENOUS)
+        return transitions
+    return expand
+
+def iter_state_graph(
+    entity_state: EntityState,
+    order: str = 'dfs',
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    compat_keys: bool = True,
+    workers: int = 1,
+    batch_size: int = 256,
+    stats: Optional[ExploreStats] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None,
+    progress_every: int = 1000,
+    exogenous: bool = False) -> Iterator[Tuple]:
+    '''gen_state_graph as a stream of ('node', key, EntityState) and ('edge', key, key)
+       events, in discovery order. a node is always yielded before its edges. no
+       edge list is kept, and exploration stops when the consumer stops iterating.
+       pass stats to follow the progress counters. the other options are those
+       of gen_state_graph; with exogenous, edge events carry their label
+       (ENDOGENOUS or EXOGENOUS) as a fourth item.'''
+    check_parallel_order(order, workers)
+    codec = entity_codec(entity_state.entity)
+    seeds = [encode_state(entity_state)]
+    exogenous_edges = set()
+    if exogenous:
+        if workers > 1:
+            raise ValueError('exogenous exploration runs in a single process')
+        events = iter_packed(codec, seeds, order, max_depth, max_states, stats, progress, progress_every, exogenous_expand(codec, exogenous_edges))
+    elif workers > 1:
+        events = iter_packed_parallel(codec, seeds, workers, batch_size, max_depth, max_states, stats, progress)
+    else:
+        events = iter_packed(codec, seeds, order, max_depth, max_states, stats, progress, progress_every)
+    keys = {}
+    for event in events:
+        if event[0] == 'node':
+            state = decode_state(codec, event[1])
+            k = keys[event[1]] = state_key(state, compat_keys)
+            yield ('node', k, state)
+        elif exogenous:
+            yield ('edge', keys[event[1]], keys[event[2]], EXOGENOUS if event[1:] in exogenous_edges else ENDOGENOUS)
+        else:
+            yield ('edge', keys[event[1]], keys[event[2]])
+
+def check_parallel_order(order: str, workers: int) -> None:
+    '''parallel exploration expands whole breadth-first levels, so it cannot
+       follow any other order'''
+    if workers > 1 and order != 'bfs':
+        raise ValueError(f"parallel exploration is breadth-first, not {order}: pass order='bfs'")
+
+def iter_packed(
+    codec: StateCodec,
+    seeds: List[int],
+    order: str = 'dfs',
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    stats: Optional[ExploreStats] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None,
+    progress_every: int = 1000,
+    expand: Optional[Callable[[int], Iterable[int]]] = None) -> Iterator[Tuple]:
+    '''explore the packed states reachable from any of the seeds in one traversal,
+       expanding each state once. yields ('node', code) and ('edge', code, code)
+       events. see gen_state_graph for the options. expand gives the successors
+       of a packed state, next_packed_states by default. breadth-first, they
+       are taken in sorted order, as iter_packed_parallel does.'''
+    if order not in ('dfs', 'bfs'):
+        raise ValueError(f"unknown exploration order: {order}")
+    stats = stats if stats is not None else ExploreStats()
+    start = time.perf_counter()
+    expand = expand if expand is not None else functools.partial(next_packed_states, codec)
+
+    def successors(code: int, depth: int) -> Iterator[int]:
+        if max_depth is not None and depth >= max_depth:
+            # a state without successors loses nothing to the depth limit
+            if expand(code):
+                stats.truncated = True
+            return iter(())
+        return iter(sorted(expand(code)) if order == 'bfs' else expand(code))
+
+    nodes = dict.fromkeys(seeds)
+    for code in nodes:
+        yield ('node', code)
+    # worklist items: (packed state, successor iterator, depth). seeds are all
+    # known up front, so a seed reached from another one is not expanded twice.
+    roots = list(nodes) if order == 'bfs' else list(reversed(nodes))
+    worklist = collections.deque((code, successors(code, 0), 0) for code in roots)
+    while worklist:
+        (code, todo, depth) = worklist[-1] if order == 'dfs' else worklist[0]
+        descend = False
+        for next_code in todo:
+            if not next_code in nodes:
+                if max_states is not None and len(nodes) >= max_states:
+                    stats.truncated = True
+                    continue
+                nodes.update({ next_code: None })
+                yield ('node', next_code)
+                worklist.append((next_code, successors(next_code, depth + 1), depth + 1))
+                stats.max_depth = max(stats.max_depth, depth + 1)
+                if order == 'dfs':
+                    stats.edges += 1
+                    yield ('edge', code, next_code)
+                    descend = True
+                    break
+            stats.edges += 1
+            yield ('edge', code, next_code)
+        if descend:
+            continue
+        if order == 'dfs':
+            worklist.pop()
+        else:
+            worklist.popleft()
+        stats.expanded += 1
+        if progress is not None and stats.expanded % progress_every == 0:
+            progress(update_stats(stats, nodes, worklist, start))
+    update_stats(stats, nodes, worklist, start)
+
+def iter_packed_parallel(
+    codec: StateCodec,
+    seeds: List[int],
+    workers: int,
+    batch_size: int = 256,
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    stats: Optional[ExploreStats] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None) -> Iterator[Tuple]:
+    '''iter_packed, expanding each breadth-first level in batches across a
+       process pool. the entity is sent to each worker once; batches are merged
+       in frontier order with sorted successors, so the result does not depend
+       on the number of workers. progress is called after every level.'''
+    stats = stats if stats is not None else ExploreStats()
+    start = time.perf_counter()
+    nodes = dict.fromkeys(seeds)
+    for code in nodes:
+        yield ('node', code)
+    frontier = list(nodes)
+    depth = 0
+    with concurrent.futures.ProcessPoolExecutor(workers, initializer=parallel.init_worker, initargs=(codec.entity,)) as pool:
+        while frontier:
+            if max_depth is not None and depth >= max_depth:
+                batches = [frontier[i:i + batch_size] for i in range(0, len(frontier), batch_size)]
+                stats.truncated = any(successors for expansions in pool.map(parallel.expand_batch, batches) for successors in expansions)
+                break
+            batches = [frontier[i:i + batch_size] for i in range(0, len(frontier), batch_size)]
+            next_frontier = []
+            for batch, expansions in zip(batches, pool.map(parallel.expand_batch, batches)):
+                for code, successors in zip(batch, expansions):
+                    for next_code in successors:
+                        if not next_code in nodes:
+                            if max_states is not None and len(nodes) >= max_states:
+                                stats.truncated = True
+                                continue
+                            nodes.update({ next_code: None })
+                            next_frontier.append(next_code)
+                            yield ('node', next_code)
+                        stats.edges += 1
+                        yield ('edge', code, next_code)
+            stats.expanded += len(frontier)
+            frontier = next_frontier
+            depth += 1
+            stats.max_depth = depth if frontier else stats.max_depth
+            if progress is not None:
+                progress(update_stats(stats, nodes, frontier, start))
+    update_stats(stats, nodes, frontier, start)
+
+def explore_packed(
+    codec: StateCodec,
+    seeds: List[int],
+    order: str = 'dfs',
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None,
+    progress_every: int = 1000,
+    expand: Optional[Callable[[int], Iterable[int]]] = None) -> Tuple[Dict[int, None], List[Tuple[int, int]], ExploreStats]:
+    '''collect the nodes and edges of iter_packed'''
+    stats = ExploreStats()
+    return collect_packed(iter_packed(codec, seeds, order, max_depth, max_states, stats, progress, progress_every, expand), stats)
+
+def explore_parallel(
+    codec: StateCodec,
+    seeds: List[int],
+    workers: int,
+    batch_size: int = 256,
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None) -> Tuple[Dict[int, None], List[Tuple[int, int]], ExploreStats]:
+    '''collect the nodes and edges of iter_packed_parallel'''
+    stats = ExploreStats()
+    return collect_packed(iter_packed_parallel(codec, seeds, workers, batch_size, max_depth, max_states, stats, progress), stats)
+
+def collect_packed(events: Iterator[Tuple], stats: ExploreStats) -> Tuple[Dict[int, None], List[Tuple[int, int]], ExploreStats]:
+    '''gather exploration events into a node dict and an edge list'''
     nodes = {}
     edges = []
-    state = entity_state
-    k = state_key(state)
-    nodes.update({ k: state })
-    (nodes, edges) = handle_state(state, nodes, edges, k)  # recursively mutate nodes/edges here
+    for event in events:
+        if event[0] == 'node':
+            nodes[event[1]] = None
+        else:
+            edges.append(event[1:])
+    return (nodes, edges, stats)
 
-    sg = StateGraph(nodes, edges)
-    # TODO: handle exogenous state changes?
-    return sg
+def decode_graph(
+    codec: StateCodec,
+    nodes: Iterable[int],
+    edges: List[Tuple[int, int]],
+    stats: Optional[ExploreStats] = None,
+    compat_keys: bool = True,
+    exogenous_edges: Iterable[Tuple[int, int]] = ()) -> Tuple[StateGraph, Dict[int, str]]:
+    '''decode a packed exploration into a StateGraph, also giving the node key
+       of each packed state. exogenous_edges are code pairs to label EXOGENOUS.'''
+    keys = {}
+    ids = {}
+    states = {}
+    for code in nodes:
+        state = decode_state(codec, code)
+        keys[code] = state_key(state, compat_keys)
+        ids[code] = len(states)
+        states[keys[code]] = state
+    sg = StateGraph.from_ids(states, ((ids[a], ids[b]) for a, b in edges), stats)
+    # edges into states dropped by a budget are not in the graph
+    # nor are the edges of states left unexpanded at a depth limit
+    n = len(states)
+    sg.exogenous_edges = {(ids[a], ids[b]) for a, b in exogenous_edges if a in ids and b in ids and ids[a] * n + ids[b] in sg.edge_set}
+    return (sg, keys)
+
+def gen_full_envisionment(
+    entity: Entity,
+    order: str = 'bfs',
+    progress: Optional[Callable[[ExploreStats], None]] = None,
+    progress_every: int = 1000,
+    compat_keys: bool = True,
+    workers: int = 1,
+    batch_size: int = 256,
+    exogenous: bool = False) -> Envisionment:
+    '''build the envisionment of every valid state of an entity: one traversal
+       seeded with all states passing state_valid, sharing discovered states
+       between seeds, plus the states each seed can reach. see gen_state_graph
+       for exogenous.'''
+    check_parallel_order(order, workers)
+    codec = entity_codec(entity)
+    seeds = list(valid_packed_states(codec))
+    exogenous_edges = set()
+    if exogenous:
+        if workers > 1:
+            raise ValueError('exogenous exploration runs in a single process')
+        (nodes, edges, stats) = explore_packed(codec, seeds, order, progress=progress, progress_every=progress_every, expand=exogenous_expand(codec, exogenous_edges))
+    elif workers > 1:
+        (nodes, edges, stats) = explore_parallel(codec, seeds, workers, batch_size, progress=progress)
+    else:
+        (nodes, edges, stats) = explore_packed(codec, seeds, order, progress=progress, progress_every=progress_every)
+    (sg, keys) = decode_graph(codec, nodes, edges, stats, compat_keys, exogenous_edges)
+    seed_keys = [keys[code] for code in seeds]
+    return Envisionment(sg, seed_keys, ReachSets(sg, seed_keys))
+
+def reachability(nodes: List[Hashable], edges: List[Tuple[Hashable, Hashable]]) -> Mapping[Hashable, int]:
+    '''for each node, a bitset over the positions in nodes of the nodes it
+       reaches (itself included), computed on lookup (see analysis.ReachSets)'''
+    return ReachSets(StateGraph(dict.fromkeys(nodes), edges))
+
+def reached_states(envisionment: Envisionment, seed: str) -> List[str]:
+    '''the keys of the states reachable from a seed of an envisionment'''
+    bits = envisionment.reachable[seed]
+    return [k for i, k in enumerate(envisionment.graph.states) if bits >> i & 1]
 
-def handle_state(
-    state: EntityState,
-    nodes: Dict[str, EntityState],
-    edges: List[Tuple[str, str]],
-    k: str) -> Tuple[Dict[str, EntityState], List[Tuple[str, str]]]:
-    ''' recursively handle a state. impure! mutates nodes/edges to return.'''
-    for next_state in next_states(state):
-        next_k = state_key(next_state)
-        edges.append((k, next_k))
-        if not next_k in nodes:
-            nodes.update({ next_k: next_state })
-            (nodes, edges) = handle_state(next_state, nodes, edges, next_k)
-    return (nodes, edges)
+def update_stats(stats: ExploreStats, nodes: Dict, worklist: Sized, start: float) -> ExploreStats:
+    '''refresh the progress counters of an exploration'''
+    stats.states = len(nodes)
+    stats.frontier = len(worklist)
+    stats.elapsed = time.perf_counter() - start
+    return stats
 
 def serialize_derivative(derivative: Direction) -> str:
     return {
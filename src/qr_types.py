@@ -1,10 +1,12 @@
 from enum import Enum, EnumMeta
-from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from dataclasses import dataclass, field, FrozenInstanceError
+from typing import List, Dict, Tuple, Optional, Iterable, Iterator, Mapping
+from array import array
 from frozen import FrozenDict
 
 import re
 import yaml
+import functools
 
 # values for Direction don't follow semantic conventions of quantity spaces (see below)
 # only the ordinal property is used, outside of QUESTION.
@@ -18,10 +20,38 @@ class Direction(Enum):
 # - the order (in which to transition), so ensure the enums are logically ordered!
 # - what is negative or positive (needed for influence relation?) - ensure underlying values reflect this!
 # - represent point values as even numbers (-> makes 0 a point), ranges as odd numbers.
-@dataclass(frozen=True)
-class Quantity:
-    name: str
-    quantitySpace: EnumMeta
+class Frozen:
+    '''base of the slotted value types below: immutable once constructed, and
+       pickled by their constructor arguments (args) rather than by slots'''
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __reduce__(self):
+        return (self.__class__, self.args())
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({', '.join(f'{k}={v!r}' for k, v in zip(self.__slots__, self.args()))})"
+
+class Quantity(Frozen):
+    __slots__ = ('name', 'quantitySpace')
+
+    def __init__(self, name: str, quantitySpace: EnumMeta):
+        object.__setattr__(self, 'name', name)
+        object.__setattr__(self, 'quantitySpace', quantitySpace)
+
+    def args(self) -> Tuple:
+        return (self.name, self.quantitySpace)
+
+    def __eq__(self, other) -> bool:
+        return self is other or (other.__class__ is self.__class__ and self.args() == other.args())
+
+    def __hash__(self) -> int:
+        return hash(self.args())
 
 @dataclass(frozen=True)
 class Relation:
@@ -54,31 +84,298 @@ class Entity:
     name: str
     quantities: Dict[str, Quantity]
     relations: List[Relation]
-    # ^ out of scope: cross-entity relations
+    # ^ cross-entity relations belong to a System (see system.py)
     exogenous_dict: Dict[str, bool]
+    # per-quantity lookup tables, filled in by compile_entity
+    tables: Optional[Dict[str, 'SpaceTable']] = field(default=None, compare=False, repr=False)
+    # relations grouped for lookup, filled in by compile_entity
+    relation_index: Optional['RelationIndex'] = field(default=None, compare=False, repr=False)
+    # the packed state codec, filled in by entity_codec (see packed.py)
+    codec: Optional['StateCodec'] = field(default=None, compare=False, repr=False)
+
+# interned QuantityPairs by (magnitude, derivative)
+PAIRS: Dict[Tuple[Enum, Direction], 'QuantityPair'] = {}
+
+class QuantityPair(Frozen):
+    '''a magnitude and derivative. pairs are interned: there is one instance per
+       value, so successor generation reuses them rather than allocating.'''
+    __slots__ = ('magnitude', 'derivative', '_hash')
+
+    def __new__(cls, magnitude: Enum, derivative: Direction) -> 'QuantityPair':
+        pair = PAIRS.get((magnitude, derivative))
+        if pair is None:
+            pair = object.__new__(cls)
+            object.__setattr__(pair, 'magnitude', magnitude)
+            object.__setattr__(pair, 'derivative', derivative)
+            object.__setattr__(pair, '_hash', hash((magnitude, derivative)))
+            PAIRS[(magnitude, derivative)] = pair
+        return pair
+
+    def args(self) -> Tuple:
+        return (self.magnitude, self.derivative)
+
+    def __eq__(self, other) -> bool:
+        # interned, but enum members of reloaded modules may still compare equal
+        return self is other or (other.__class__ is self.__class__ and self.args() == other.args())
+
+    def __hash__(self) -> int:
+        return self._hash
+
+class EntityState(Frozen):
+    '''a state of an entity: a QuantityPair per quantity name. the slots after
+       state cache its keys (None until computed), see canonical_key and state_key.'''
+    __slots__ = ('entity', 'state', '_canonical_key', '_state_key', '_canonical_state_key')
+
+    def __init__(self, entity: Entity, state: Dict[str, QuantityPair]):
+        object.__setattr__(self, 'entity', entity)
+        object.__setattr__(self, 'state', state)
+        object.__setattr__(self, '_canonical_key', None)
+        object.__setattr__(self, '_state_key', None)
+        object.__setattr__(self, '_canonical_state_key', None)
+
+    def args(self) -> Tuple:
+        return (self.entity, self.state)
+
+    def __eq__(self, other) -> bool:
+        return self is other or (
+            other.__class__ is self.__class__ and
+            (self.entity is other.entity or self.entity == other.entity) and
+            self.state == other.state)
+
+    def __hash__(self) -> int:
+        return hash(canonical_key(self))
 
 @dataclass(frozen=True)
-class QuantityPair:
-    magnitude: Enum
-    derivative: Direction
+class SpaceTable:
+    '''lookup tables of a quantity space. tuples are indexed by magnitude ordinal.'''
+    members: Tuple[Enum, ...]
+    index: Dict[Enum, int]
+    extremes: Tuple[Direction, ...]  # extreme direction of each magnitude
+    clip_signs: Tuple[int, ...]      # sign of the extreme a point magnitude sits at, else 0
+    points: Tuple[bool, ...]         # point (True) or range (False)
+    signs: Tuple[int, ...]           # sign of the magnitude value
+    nexts: Tuple[int, ...]           # ordinal one step up, clamped
+    prevs: Tuple[int, ...]           # ordinal one step down, clamped
+
+@functools.lru_cache(maxsize=None)
+def space_table(space: EnumMeta) -> SpaceTable:
+    '''precompute the lookup tables of a quantity space'''
+    members = tuple(space)
+    values = [magnitude.value for magnitude in members]
+    extremes = tuple(
+        Direction.NEGATIVE if val == min(values) else
+        Direction.POSITIVE if val == max(values) else
+        Direction.NEUTRAL
+        for val in values)
+    points = tuple(val % 2 == 0 for val in values)
+    last = len(members) - 1
+    return SpaceTable(
+        members=members,
+        index={magnitude: i for i, magnitude in enumerate(members)},
+        extremes=extremes,
+        clip_signs=tuple(
+            (1 if side == Direction.POSITIVE else -1 if side == Direction.NEGATIVE else 0) if point else 0
+            for side, point in zip(extremes, points)),
+        points=points,
+        signs=tuple((val > 0) - (val < 0) for val in values),
+        nexts=tuple(min(last, i + 1) for i in range(len(members))),
+        prevs=tuple(max(0, i - 1) for i in range(len(members))),
+    )
 
 @dataclass(frozen=True)
-class EntityState:
-    entity: Entity
-    state: Dict[str, QuantityPair]
+class RelationIndex:
+    '''the relations of an entity, grouped so a state only visits relevant ones'''
+    influences: Dict[str, List[Influence]]                         # by target quantity
+    proportionals: Dict[str, List[Proportional]]                   # by target quantity
+    correspondences: Dict[Tuple[str, Enum], List[ValueCorrespondence]]  # by source (quantity, magnitude)
+    correspondents: Dict[Tuple[str, Enum], List[ValueCorrespondence]]   # by target (quantity, magnitude)
 
-    def __hash__(self) -> int:
-        return hash(state_key(self))
+def index_relations(relations: List[Relation]) -> RelationIndex:
+    '''group relations by type and the quantity (value) they act on'''
+    index = RelationIndex({}, {}, {}, {})
+    for relation in relations:
+        if type(relation) == Influence:
+            index.influences.setdefault(relation.b.name, []).append(relation)
+        elif type(relation) == Proportional:
+            index.proportionals.setdefault(relation.b.name, []).append(relation)
+        elif type(relation) == ValueCorrespondence:
+            index.correspondences.setdefault(relation.a, []).append(relation)
+            index.correspondents.setdefault(relation.b, []).append(relation)
+    return index
+
+def compile_entity(entity: Entity) -> Entity:
+    '''precompute the lookup tables and relation index of an entity, once. run by make_entity.'''
+    tables = {k: space_table(qty.quantitySpace) for k, qty in entity.quantities.items()}
+    object.__setattr__(entity, 'tables', tables)
+    object.__setattr__(entity, 'relation_index', index_relations(entity.relations))
+    return entity
+
+def entity_tables(entity: Entity) -> Dict[str, SpaceTable]:
+    '''get the lookup tables of an entity, compiling it if needed'''
+    return entity.tables if entity.tables is not None else compile_entity(entity).tables
+
+def entity_relations(entity: Entity) -> RelationIndex:
+    '''get the relation index of an entity, compiling it if needed'''
+    return entity.relation_index if entity.relation_index is not None else compile_entity(entity).relation_index
 
-def state_key(state: EntityState) -> str:
-    '''serialize state for graph key purposes'''
-    return re.sub(r"[^\w]+", '_', serialize_state(state))
+def canonical_key(state: EntityState) -> Tuple[int, ...]:
+    '''canonical state key: (magnitude ordinal, derivative value) per quantity,
+       in the entity's quantity order. cached on the state.'''
+    key = state._canonical_key
+    if key is None:
+        pairs = state.state
+        key = tuple(
+            x for pair in (pairs[k] for k in state.entity.quantities if k in pairs)
+            for x in (space_table(type(pair.magnitude)).index[pair.magnitude], pair.derivative.value)
+        )
+        object.__setattr__(state, '_canonical_key', key)
+    return key
+
+def state_key(state: EntityState, compat: bool = True) -> str:
+    '''serialize state for graph key purposes. the compat keys match the
+       original yaml-based ones (e.g. `inflow_0_3_outflow_0_2_volume_0_2_`),
+       otherwise the canonical key is joined (e.g. `0_3_0_2_0_2`).'''
+    attr = '_state_key' if compat else '_canonical_state_key'
+    key = state._state_key if compat else state._canonical_state_key
+    if key is None:
+        if compat:
+            pairs = state.state
+            text = ''.join(f"{k}: ({pairs[k].magnitude.value}, {pairs[k].derivative.value})\n" for k in sorted(pairs))
+            key = re.sub(r"[^\w]+", '_', text)
+        else:
+            key = '_'.join(map(str, canonical_key(state)))
+        object.__setattr__(state, attr, key)
+    return key
 
 def serialize_state(state: EntityState) -> str:
     '''simple serialization method for EntityState'''
     return yaml.dump({k: f"({pair.magnitude.value}, {pair.derivative.value})" for k, pair in state.state.items()})
 
-@dataclass(frozen=True)
+@dataclass
+class ExploreStats:
+    '''progress counters of a state-space exploration'''
+    states: int = 0
+    edges: int = 0
+    expanded: int = 0
+    frontier: int = 0
+    max_depth: int = 0
+    elapsed: float = 0.0
+    truncated: bool = False
+    # the profile summary at the end of the exploration, while profiling is enabled
+    profile: Optional[Dict] = None
+
+    @property
+    def states_per_sec(self) -> float:
+        return self.states / self.elapsed if self.elapsed > 0 else 0.0
+
+# edge labels: transitions following from the relations of an entity, or
+# from exogenous changes of a derivative (see next_packed_transitions)
+ENDOGENOUS = 'endogenous'
+EXOGENOUS = 'exogenous'
+
 class StateGraph:
-    states: Dict[str, EntityState]
-    edges: List[Tuple[str, str]]
+    '''states by key, with deduplicated edges stored as CSR adjacency arrays over
+       integer node ids (the position of a state in states), both forward and
+       reverse. edge membership is an O(1) set lookup. exogenous_edges holds
+       the id pairs of edges only reached by exogenous changes.'''
+
+    def __init__(self, states: Dict[str, EntityState], edges: Iterable[Tuple[str, str]] = (), stats: Optional[ExploreStats] = None):
+        ids = {k: i for i, k in enumerate(states)}
+        self._init(states, ((ids[a], ids[b]) for a, b in edges), stats, ids)
+
+    @classmethod
+    def from_ids(cls, states: Dict[str, EntityState], edges: Iterable[Tuple[int, int]], stats: Optional[ExploreStats] = None) -> 'StateGraph':
+        '''make a graph from edges given as node id pairs'''
+        sg = cls.__new__(cls)
+        sg._init(states, edges, stats, {k: i for i, k in enumerate(states)})
+        return sg
+
+    def _init(self, states: Dict[str, EntityState], edges: Iterable[Tuple[int, int]], stats: Optional[ExploreStats], ids: Dict[str, int]) -> None:
+        self.states = states
+        self.stats = stats
+        self.keys = list(states)
+        self.ids = ids
+        n = len(self.keys)
+        # an edge a -> b is a * n + b in the membership set
+        self.edge_set = set()
+        pairs = []
+        for a, b in edges:
+            edge = a * n + b
+            if not edge in self.edge_set:
+                self.edge_set.add(edge)
+                pairs.append((a, b))
+        (self.out_offsets, self.out_targets) = csr(n, pairs, 0)
+        (self.in_offsets, self.in_sources) = csr(n, pairs, 1)
+        self._edges = None
+        self.exogenous_edges = set()
+
+    @property
+    def edges(self) -> List[Tuple[str, str]]:
+        '''the edges as (key, key) pairs, grouped by source. built on first use.'''
+        if self._edges is None:
+            keys = self.keys
+            self._edges = [(keys[a], keys[b]) for a, b in self.edge_ids()]
+        return self._edges
+
+    def edge_ids(self) -> Iterator[Tuple[int, int]]:
+        '''the edges as node id pairs, grouped by source'''
+        offsets = self.out_offsets
+        targets = self.out_targets
+        for a in range(len(self.keys)):
+            for i in range(offsets[a], offsets[a + 1]):
+                yield (a, targets[i])
+
+    def num_edges(self) -> int:
+        return len(self.out_targets)
+
+    def edge_label(self, a: int, b: int) -> str:
+        '''ENDOGENOUS or EXOGENOUS, for the edge between two node ids'''
+        return EXOGENOUS if (a, b) in self.exogenous_edges else ENDOGENOUS
+
+    def has_edge(self, a: str, b: str) -> bool:
+        ids = self.ids
+        return a in ids and b in ids and ids[a] * len(self.keys) + ids[b] in self.edge_set
+
+    def successor_ids(self, i: int) -> array:
+        return self.out_targets[self.out_offsets[i]:self.out_offsets[i + 1]]
+
+    def predecessor_ids(self, i: int) -> array:
+        return self.in_sources[self.in_offsets[i]:self.in_offsets[i + 1]]
+
+    def successors(self, k: str) -> List[str]:
+        return [self.keys[i] for i in self.successor_ids(self.ids[k])]
+
+    def predecessors(self, k: str) -> List[str]:
+        return [self.keys[i] for i in self.predecessor_ids(self.ids[k])]
+
+    def out_degree(self, k: str) -> int:
+        i = self.ids[k]
+        return self.out_offsets[i + 1] - self.out_offsets[i]
+
+    def in_degree(self, k: str) -> int:
+        i = self.ids[k]
+        return self.in_offsets[i + 1] - self.in_offsets[i]
+
+def csr(n: int, pairs: List[Tuple[int, int]], side: int) -> Tuple[array, array]:
+    '''compressed sparse rows of id pairs, grouped on pair[side], keeping pair order within a row'''
+    offsets = array('q', [0]) * (n + 1)
+    for pair in pairs:
+        offsets[pair[side] + 1] += 1
+    for i in range(n):
+        offsets[i + 1] += offsets[i]
+    fill = array('q', offsets)
+    neighbours = array('q', [0]) * len(pairs)
+    for pair in pairs:
+        row = pair[side]
+        neighbours[fill[row]] = pair[1 - side]
+        fill[row] += 1
+    return (offsets, neighbours)
+
+@dataclass(frozen=True)
+class Envisionment:
+    '''a state graph explored from many seeds at once. reachable maps each seed
+       to a bitset over the graph's node order of the states it reaches,
+       computed on lookup (see analysis.ReachSets).'''
+    graph: StateGraph
+    seeds: List[str]
+    reachable: Mapping[str, int]
@@ -0,0 +1,214 @@
+'''goal-directed queries on behaviour: can a state reach states matching a
+   partial state, and by which transitions?
+
+   find_paths runs bounded A* (or breadth-first) searches from a state over
+   packed states with next_packed_states, expanding states only until k
+   shortest paths to the goal are found, rather than exploring the whole
+   envisionment first. goals are partial states: per quantity a magnitude,
+   a derivative, both, or a predicate on the whole state.'''
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from qr import *
+
+import heapq
+import itertools
+import time
+
+# the value a goal asks of a quantity: a magnitude, a derivative or both
+GoalValue = Union[Enum, Direction, Tuple[Enum, Direction], QuantityPair]
+Goal = Union[Dict[str, GoalValue], Callable[[EntityState], bool]]
+
+METHODS = ('astar', 'bfs')
+
+@dataclass(frozen=True)
+class BehaviourPath:
+    '''a path of states from the start state to a goal state, with the
+       inter_state_trace of each transition (if asked for)'''
+    keys: List[str]
+    states: List[EntityState]
+    traces: List[str] = field(default_factory=list, repr=False)
+
+    def __len__(self) -> int:
+        '''the number of transitions'''
+        return len(self.states) - 1
+
+@dataclass(frozen=True)
+class QueryResult:
+    paths: List[BehaviourPath]
+    stats: ExploreStats
+
+    @property
+    def reachable(self) -> bool:
+        return bool(self.paths)
+
+def goal_fields(entity: Entity, goal: Dict[str, GoalValue]) -> List[Tuple[int, Optional[int], Optional[int]]]:
+    '''per constrained quantity: (codec position, magnitude index or None,
+       derivative sign or None)'''
+    codec = entity_codec(entity)
+    position = {k: i for i, k in enumerate(codec.names)}
+    fields = []
+    for k, value in goal.items():
+        if k not in position:
+            raise ValueError(f"unknown quantity: {k}")
+        table = codec.tables[position[k]]
+        if isinstance(value, QuantityPair):
+            value = value.args()
+        (magnitude, derivative) = value if isinstance(value, tuple) else (None, value) if isinstance(value, Direction) else (value, None)
+        if magnitude is not None and magnitude not in table.index:
+            raise ValueError(f"{magnitude} is not a magnitude of {k}")
+        fields.append((
+            position[k],
+            table.index[magnitude] if magnitude is not None else None,
+            DERIVATIVE_CODES[derivative] - 1 if derivative is not None else None))
+    return fields
+
+def goal_predicate(entity: Entity, goal: Goal) -> Callable[[int], bool]:
+    '''whether a packed state of an entity meets a goal'''
+    if callable(goal):
+        codec = entity_codec(entity)
+        return lambda code: goal(decode_state(codec, code))
+    fields = goal_fields(entity, goal)
+    codec = entity_codec(entity)
+
+    def predicate(code: int) -> bool:
+        pairs = unpack(codec, code)
+        return all(
+            (idx is None or pairs[q][0] == idx) and (sign is None or pairs[q][1] == sign)
+            for (q, idx, sign) in fields)
+    return predicate
+
+def goal_heuristic(entity: Entity, goal: Goal) -> Callable[[int], int]:
+    '''a lower bound on the transitions from a packed state to a goal: a
+       magnitude moves at most one step per transition, and a wrong derivative
+       takes at least one. consistent, so A* finds shortest paths. 0 for
+       predicate goals.'''
+    if callable(goal):
+        return lambda code: 0
+    fields = goal_fields(entity, goal)
+    codec = entity_codec(entity)
+
+    def heuristic(code: int) -> int:
+        pairs = unpack(codec, code)
+        return max((
+            max(abs(pairs[q][0] - idx) if idx is not None else 0, int(sign is not None and pairs[q][1] != sign))
+            for (q, idx, sign) in fields), default=0)
+    return heuristic
+
+def find_paths(
+    start: EntityState,
+    goal: Goal,
+    k: int = 1,
+    method: str = 'astar',
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    explain: bool = True,
+    exogenous: bool = False,
+    compat_keys: bool = True) -> QueryResult:
+    '''the k shortest behaviour paths from start to states meeting goal,
+       shortest first. paths end at the first goal state they reach and do not
+       revisit states. the shortest is found by a search from start; the others
+       by Yen's algorithm, which searches from each state of the last path found
+       for a detour off the paths sharing its prefix up to that state.
+
+       method is 'astar' (guided by goal_heuristic) or 'bfs'. the search stops
+       at paths longer than max_depth or after expanding max_states distinct
+       states, marking the stats as truncated if that left it with fewer than
+       k paths. explain adds the inter_state_trace of each transition. with
+       exogenous, exogenous changes are followed too (see
+       next_packed_transitions).'''
+    if method not in METHODS:
+        raise ValueError(f"unknown search method: {method}")
+    codec = entity_codec(start.entity)
+    is_goal = goal_predicate(start.entity, goal)
+    heuristic = goal_heuristic(start.entity, goal) if method == 'astar' else (lambda code: 0)
+    successors = next_packed_transitions if exogenous else next_packed_states
+    stats = ExploreStats()
+    begin = time.perf_counter()
+    order = itertools.count()
+    # the distinct states expanded by any search
+    expanded = set()
+    # a search went past max_depth, or stopped at max_states
+    cut = False
+    exhausted = False
+
+    def shortest(root: List[int], banned: Set[int]) -> Optional[List[int]]:
+        '''a shortest path continuing root from its last state, avoiding the
+           other states of root and, from its last state, the banned ones'''
+        nonlocal cut, exhausted
+        source = root[-1]
+        offset = len(root) - 1
+        avoid = set(root[:-1])
+        # heap items: (estimated length, tie breaker, length, state)
+        heap = [(heuristic(source), next(order), 0, source)]
+        parents = {source: None}
+        lengths = {source: 0}
+        closed = set()
+        while heap:
+            (_, _, depth, code) = heapq.heappop(heap)
+            if code in closed:
+                continue
+            if code not in expanded:
+                if max_states is not None and len(expanded) >= max_states:
+                    cut = exhausted = True
+                    return None
+                expanded.add(code)
+            closed.add(code)
+            stats.expanded += 1
+            stats.max_depth = max(stats.max_depth, offset + depth)
+            if is_goal(code):
+                path = []
+                while code is not None:
+                    path.append(code)
+                    code = parents[code]
+                return root[:-1] + path[::-1]
+            if max_depth is not None and offset + depth >= max_depth:
+                cut = True
+                continue
+            for next_code in sorted(successors(codec, code)):
+                if next_code in avoid or next_code in closed or (code == source and next_code in banned):
+                    continue
+                stats.edges += 1
+                if depth + 1 < lengths.get(next_code, depth + 2):
+                    lengths[next_code] = depth + 1
+                    parents[next_code] = code
+                    heapq.heappush(heap, (depth + 1 + heuristic(next_code), next(order), depth + 1, next_code))
+        return None
+
+    found = []
+    path = shortest([encode_state(start)], set())
+    # candidate paths: (length, tie breaker, path)
+    candidates = []
+    seen = set()
+    while path is not None:
+        found.append(path)
+        seen.add(tuple(path))
+        if len(found) == k:
+            break
+        # detours off the last path: from each of its states, avoiding the
+        # states before it and the next states of the found paths sharing
+        # that prefix
+        for i in range(len(path) - 1):
+            root = path[:i + 1]
+            banned = {other[i + 1] for other in found if other[:i + 1] == root}
+            detour = shortest(root, banned)
+            if exhausted:
+                break
+            if detour is not None and tuple(detour) not in seen:
+                seen.add(tuple(detour))
+                heapq.heappush(candidates, (len(detour), next(order), detour))
+        path = heapq.heappop(candidates)[2] if candidates and not exhausted else None
+    stats.truncated = cut and len(found) < k
+    stats.states = len(expanded)
+    stats.elapsed = time.perf_counter() - begin
+    return QueryResult([behaviour_path(codec, path, explain, compat_keys) for path in found], stats)
+
+def behaviour_path(codec: StateCodec, path: List[int], explain: bool = True, compat_keys: bool = True) -> BehaviourPath:
+    states = [decode_state(codec, code) for code in path]
+    traces = [inter_state_trace(a, b) for a, b in zip(states, states[1:])] if explain else []
+    return BehaviourPath([state_key(state, compat_keys) for state in states], states, traces)
+
+def can_reach(start: EntityState, goal: Goal, **options) -> bool:
+    '''whether some state meeting goal is reachable from start, within the
+       bounds of find_paths'''
+    return find_paths(start, goal, explain=False, **options).reachable
@@ -0,0 +1,94 @@
+'''graphviz rendering pipeline: each layout engine runs once per graph, its
+   positioned graph is then drawn to every output format without re-layout.
+   layouts and drawings are cached on disk by content hash of the dot source.'''
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import concurrent.futures
+import hashlib
+import os
+import shutil
+import pygraphviz as pgv
+
+# the default layout engines and formats; any graphviz engine or format works
+LAYOUTS = ('dot', 'neato', 'circo')
+FORMATS = ('svg', 'png')
+
+def content_hash(source: str) -> str:
+    '''hash of a dot source, the cache key of everything rendered from it'''
+    return hashlib.sha256(source.encode('utf-8')).hexdigest()
+
+def cache_path(cache_dir: str, digest: str, prog: str, fmt: str) -> str:
+    return os.path.join(cache_dir, f"{digest}.{prog}.{fmt}")
+
+def write_atomic(path: str, data: bytes) -> None:
+    '''write via a temporary file so concurrent renders never see partial output'''
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def layout(source: str, prog: str, cache_dir: str) -> str:
+    '''run a layout engine on a dot source, returning the positioned dot source'''
+    path = cache_path(cache_dir, content_hash(source), prog, 'dot')
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    A = pgv.AGraph(string=source)
+    A.layout(prog=prog)
+    positioned = A.string()
+    write_atomic(path, positioned.encode('utf-8'))
+    return positioned
+
+def draw(positioned: str, digest: str, prog: str, fmt: str, cache_dir: str) -> str:
+    '''draw a positioned dot source to a format, reusing its layout (neato -n2)'''
+    path = cache_path(cache_dir, digest, prog, fmt)
+    if not os.path.exists(path):
+        A = pgv.AGraph(string=positioned)
+        write_atomic(path, A.draw(format=fmt, prog='neato', args='-n2'))
+    return path
+
+def render(
+    source: str,
+    layouts: Iterable[str] = LAYOUTS,
+    formats: Iterable[str] = FORMATS,
+    out_dir: str = '.',
+    cache_dir: str = '.render_cache',
+    workers: Optional[int] = None,
+) -> Dict[Tuple[str, str], str]:
+    '''render a dot source with each layout engine to each format, writing
+       `<out_dir>/<layout>.<format>`. layouts fan out over a process pool, then
+       every (layout, format) drawing does; workers=1, or a single drawing to
+       make, renders in-process. returns the written paths by (layout, format).'''
+    layouts = list(layouts)
+    formats = list(formats)
+    os.makedirs(cache_dir, exist_ok=True)
+    os.makedirs(out_dir, exist_ok=True)
+    digest = content_hash(source)
+    jobs = [(prog, fmt) for prog in layouts for fmt in formats]
+    cached = {job: cache_path(cache_dir, digest, *job) for job in jobs}
+    missing = [job for job in jobs if not os.path.exists(cached[job])]
+    stale = sorted({prog for (prog, _) in missing}, key=layouts.index)
+
+    if stale and (workers == 1 or len(missing) == 1):
+        positioned = {prog: layout(source, prog, cache_dir) for prog in stale}
+        for (prog, fmt) in missing:
+            draw(positioned[prog], digest, prog, fmt, cache_dir)
+    elif stale:
+        # no more processes than drawings to make
+        with concurrent.futures.ProcessPoolExecutor(workers or min(os.cpu_count() or 1, len(missing))) as pool:
+            laid_out = {pool.submit(layout, source, prog, cache_dir): prog for prog in stale}
+            drawings = []
+            # start drawing an engine's formats as soon as its layout is done
+            for future in concurrent.futures.as_completed(laid_out):
+                prog = laid_out[future]
+                positioned = future.result()
+                drawings += [pool.submit(draw, positioned, digest, prog, fmt, cache_dir) for (p, fmt) in missing if p == prog]
+            for future in drawings:
+                future.result()
+
+    paths = {}
+    for job in jobs:
+        paths[job] = os.path.join(out_dir, '.'.join(job))
+        shutil.copyfile(cached[job], paths[job])
+    return paths
@@ -0,0 +1,170 @@
+'''binary state graph files, loaded by memory-mapping them.
+
+   layout (native byte order, recorded in the header):
+   - magic `QRSGRAPH`, then version and header length as little-endian u32s;
+   - a JSON header: entity schema, key style, node/edge counts, exogenous
+     edges and stats, padded to 8 bytes;
+   - the packed state code of every node (u64), in node id order;
+   - the forward CSR arrays out_offsets (n + 1) and out_targets (m), then the
+     reverse in_offsets (n + 1) and in_sources (m), all i64.'''
+
+from dataclasses import asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from qr_types import *
+from packed import *
+
+import json
+import mmap
+import struct
+import sys
+
+MAGIC = b'QRSGRAPH'
+VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+
+def entity_schema(codec: StateCodec) -> Dict[str, Any]:
+    '''what a graph file needs to match against the entity it is loaded for'''
+    return {
+        'entity': codec.entity.name,
+        'quantities': [[k, [m.name for m in table.members]] for k, table in zip(codec.names, codec.tables)],
+    }
+
+def key_style(sg: StateGraph, compat_keys: Optional[bool] = None) -> bool:
+    '''the state_key format of a graph's node keys: compat_keys if given and
+       every key has it, else whichever format every key has'''
+    states = [sg.states[k] for k in sg.keys]
+    for compat in ((True, False) if compat_keys is None else (compat_keys,)):
+        if all(k == state_key(state, compat) for k, state in zip(sg.keys, states)):
+            return compat
+    raise ValueError('the node keys are not state keys of a single format')
+
+def save_graph(sg: StateGraph, path: str, entity: Optional[Entity] = None, compat_keys: Optional[bool] = None) -> None:
+    '''write a state graph to a binary graph file. the entity defaults to that
+       of the graph's states, the key format to the one its keys have (see
+       key_style).'''
+    if entity is None:
+        if not sg.keys:
+            raise ValueError('the entity of an empty graph must be given')
+        entity = sg.states[sg.keys[0]].entity
+    codec = entity_codec(entity)
+    if sum(mask.bit_length() for mask in codec.masks) > 64:
+        raise ValueError(f"states of {entity.name} do not fit in 64 bits")
+    compat = key_style(sg, compat_keys)
+    states = [sg.states[k] for k in sg.keys]
+    header = {
+        **entity_schema(codec),
+        'compat_keys': compat,
+        'byteorder': sys.byteorder,
+        'nodes': len(states),
+        'edges': sg.num_edges(),
+        'exogenous_edges': sorted(sg.exogenous_edges),
+        'stats': asdict(sg.stats) if sg.stats is not None else None,
+    }
+    blob = json.dumps(header).encode('utf-8')
+    blob += b' ' * (-(PREAMBLE.size + len(blob)) % 8)
+    with open(path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, len(blob)))
+        f.write(blob)
+        f.write(array('Q', (encode_state(state) for state in states)))
+        for arr in (sg.out_offsets, sg.out_targets, sg.in_offsets, sg.in_sources):
+            f.write(arr)
+
+class MappedStateGraph(StateGraph):
+    '''a StateGraph read from a memory-mapped graph file, see load_graph. the
+       CSR arrays and state codes are memoryviews into the file; states, keys
+       and ids are decoded on first use, single states by state_at.'''
+
+    def __init__(self, path: str, entity: Entity):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (size, header) = self._read_header(path, entity)
+        except BaseException:
+            self._mmap.close()
+            raise
+        self.compat_keys = header['compat_keys']
+        self.stats = ExploreStats(**header['stats']) if header['stats'] is not None else None
+        (n, m) = (header['nodes'], header['edges'])
+        self._view = view = memoryview(self._mmap)
+        offset = PREAMBLE.size + size
+        sections = []
+        for (fmt, count) in (('Q', n), ('q', n + 1), ('q', m), ('q', n + 1), ('q', m)):
+            sections.append(view[offset:offset + count * 8].cast(fmt))
+            offset += count * 8
+        (self.codes, self.out_offsets, self.out_targets, self.in_offsets, self.in_sources) = sections
+        self._states = None
+        self._keys = None
+        self._ids = None
+        self._edges = None
+        # files written before exogenous edges were recorded have none
+        self.exogenous_edges = {tuple(edge) for edge in header.get('exogenous_edges', [])}
+
+    def _read_header(self, path: str, entity: Entity) -> Tuple[int, Dict[str, Any]]:
+        '''the header length and header, checked against the entity and the file size'''
+        if len(self._mmap) < PREAMBLE.size:
+            raise ValueError(f"not a state graph file: {path}")
+        (magic, version, size) = PREAMBLE.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"not a version {VERSION} state graph file: {path}")
+        header = json.loads(self._mmap[PREAMBLE.size:PREAMBLE.size + size])
+        self.codec = entity_codec(entity)
+        if header['entity'] != entity.name or header['quantities'] != entity_schema(self.codec)['quantities']:
+            raise ValueError(f"{path} holds a graph of another entity schema than {entity.name}")
+        if header['byteorder'] != sys.byteorder:
+            raise ValueError(f"{path} was written with {header['byteorder']} byte order")
+        (n, m) = (header['nodes'], header['edges'])
+        if len(self._mmap) < PREAMBLE.size + size + (3 * n + 2 * m + 2) * 8:
+            raise ValueError(f"{path} is truncated")
+        return (size, header)
+
+    def state_at(self, i: int) -> EntityState:
+        '''decode the state of node i alone'''
+        return decode_state(self.codec, self.codes[i])
+
+    @property
+    def keys(self) -> List[str]:
+        if self._keys is None:
+            self._keys = list(self.states)
+        return self._keys
+
+    @property
+    def states(self) -> Dict[str, EntityState]:
+        if self._states is None:
+            self._states = {}
+            for code in self.codes:
+                state = decode_state(self.codec, code)
+                self._states[state_key(state, self.compat_keys)] = state
+        return self._states
+
+    @property
+    def ids(self) -> Dict[str, int]:
+        if self._ids is None:
+            self._ids = {k: i for i, k in enumerate(self.keys)}
+        return self._ids
+
+    def edge_ids(self) -> Iterator[Tuple[int, int]]:
+        offsets = self.out_offsets
+        targets = self.out_targets
+        for a in range(len(self.codes)):
+            for i in range(offsets[a], offsets[a + 1]):
+                yield (a, targets[i])
+
+    def has_edge(self, a: str, b: str) -> bool:
+        ids = self.ids
+        return a in ids and b in ids and ids[b] in self.successor_ids(ids[a])
+
+    def close(self) -> None:
+        '''release the views into the file, then unmap it'''
+        for name in ('codes', 'out_offsets', 'out_targets', 'in_offsets', 'in_sources', '_view'):
+            getattr(self, name).release()
+        self._mmap.close()
+
+    def __enter__(self) -> 'MappedStateGraph':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def load_graph(path: str, entity: Entity) -> MappedStateGraph:
+    '''memory-map a graph file written by save_graph, for an entity of the same schema'''
+    return MappedStateGraph(path, entity)
@@ -0,0 +1,240 @@
+'''symbolic envisionment: sets of states and the transition relation of an
+   entity as BDDs over its bit-encoded quantities, so reachable sets can be
+   computed and counted without enumerating states.
+
+   each quantity takes the fields of its packed code (packed.py): a magnitude
+   index and a derivative code (sign + 1), in binary. the transition relation
+   encodes the rules of next_packed_states, with two auxiliary fields per
+   quantity: its magnitude choice before value correspondences force it, and
+   its derivative after influences but before proportionalities.'''
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from qr_types import *
+from packed import *
+from prune import SIGN_MOVES, combine_signs, clip_signs, successor_plan
+from bdd import BDD, FALSE, TRUE
+
+import itertools
+
+@dataclass(frozen=True)
+class Field:
+    '''the BDD variables of an integer field, least significant bit first'''
+    vars: Tuple[int, ...]
+    size: int   # the number of valid values
+
+@dataclass(frozen=True)
+class QuantityFields:
+    magnitude: Field        # current state
+    derivative: Field
+    next_magnitude: Field   # successor state
+    next_derivative: Field
+    choice: Field           # magnitude choice (auxiliary)
+    influenced: Field       # derivative after influences (auxiliary)
+
+def bits(size: int) -> int:
+    return max(1, (size - 1).bit_length())
+
+class SymbolicEntity:
+    '''the validity rules and transition relation of an entity as BDDs. state
+       sets are BDD nodes over the current state variables.
+
+       variables are laid out per quantity, in codec order: the auxiliary fields,
+       then the current and successor fields with their bits interleaved, so
+       renaming successor to current variables keeps the variable order.'''
+
+    def __init__(self, entity: Entity):
+        self.codec = codec = entity_codec(entity)
+        self.fields = []
+        v = 0
+        for table in codec.tables:
+            (m, d) = (bits(len(table.members)), bits(3))
+            choice = Field(tuple(range(v, v + m)), len(table.members))
+            influenced = Field(tuple(range(v + m, v + m + d)), 3)
+            v += m + d
+            # interleave current and successor bits
+            magnitude = Field(tuple(range(v, v + 2 * m, 2)), len(table.members))
+            next_magnitude = Field(tuple(range(v + 1, v + 2 * m, 2)), len(table.members))
+            v += 2 * m
+            derivative = Field(tuple(range(v, v + 2 * d, 2)), 3)
+            next_derivative = Field(tuple(range(v + 1, v + 2 * d, 2)), 3)
+            v += 2 * d
+            self.fields.append(QuantityFields(magnitude, derivative, next_magnitude, next_derivative, choice, influenced))
+        self.bdd = BDD(v)
+        self.current = sorted(x for f in self.fields for field in (f.magnitude, f.derivative) for x in field.vars)
+        self.next = sorted(x for f in self.fields for field in (f.next_magnitude, f.next_derivative) for x in field.vars)
+        self.auxiliary = frozenset(x for f in self.fields for field in (f.choice, f.influenced) for x in field.vars)
+        self.to_current = dict(zip(self.next, self.current))
+        self.valid = self.build_valid()
+        self.transition = self.build_transition()
+
+    # building blocks
+
+    def relation(self, fields: List[Field], allowed: Iterable[Tuple[int, ...]]) -> int:
+        '''the set of values of some fields given by a list of allowed tuples'''
+        bdd = self.bdd
+        return bdd.disjoin(
+            bdd.cube({x: bool(value >> i & 1) for field, value in zip(fields, values) for i, x in enumerate(field.vars)})
+            for values in set(allowed))
+
+    def table_relation(self, fields: List[Field], predicate) -> int:
+        '''the set of valid values of some fields satisfying a predicate'''
+        return self.relation(fields, (values for values in itertools.product(*(range(field.size) for field in fields)) if predicate(*values)))
+
+    def equals(self, field: Field, value: int) -> int:
+        return self.relation([field], [(value,)])
+
+    def effect_relation(self, fields: List[Field], terms: List[Tuple[Field, Tuple[int, ...]]], predicate) -> int:
+        '''the set of valid values of some fields satisfying predicate(*values,
+           effect), where effect is combine_signs of the signs of some terms,
+           each a field and the sign of each of its values. the terms are
+           folded into two sets, some term positive and some term negative,
+           so the relation grows linearly in the terms rather than with the
+           product of their fields.'''
+        bdd = self.bdd
+        positive = bdd.disjoin(self.relation([field], [(v,) for v, sign in enumerate(signs) if sign > 0]) for field, signs in terms)
+        negative = bdd.disjoin(self.relation([field], [(v,) for v, sign in enumerate(signs) if sign < 0]) for field, signs in terms)
+        return bdd.disjoin(
+            bdd.conjoin([
+                positive if p else bdd.not_(positive),
+                negative if n else bdd.not_(negative),
+                self.table_relation(fields, lambda *values, effect=combine_signs((p, -n)): predicate(*values, effect))])
+            for p in (0, 1) for n in (0, 1))
+
+    # validity and transitions
+
+    def build_valid(self) -> int:
+        '''state_valid on the current state variables, as valid_packed_states'''
+        bdd = self.bdd
+        parts = []
+        for table, f in zip(self.codec.tables, self.fields):
+            # check_extremes: no derivative pushing a point magnitude off its edge
+            parts.append(self.table_relation([f.magnitude, f.derivative], lambda idx, der: not (table.clip_signs[idx] and der - 1 == table.clip_signs[idx])))
+        for (qa, va), targets in self.codec.correspondences.items():
+            for (qb, vb) in targets:
+                # check_value_correspondence: either both sides hold or neither does
+                a = self.equals(self.fields[qa].magnitude, va)
+                b = self.equals(self.fields[qb].magnitude, vb)
+                parts.append(bdd.ite(a, b, bdd.not_(b)))
+        return bdd.conjoin(parts)
+
+    def build_transition(self) -> int:
+        '''next_packed_states as a relation between current and successor variables'''
+        bdd = self.bdd
+        codec = self.codec
+        plan = successor_plan(codec)
+        tables = codec.tables
+        fields = self.fields
+        n = len(tables)
+        magnitude_parts = []
+        for q, (table, f) in enumerate(zip(tables, fields)):
+            # magnitude choices: a step along the derivative, or staying put for ranges
+            def choice_ok(idx: int, der: int, choice: int, table=table) -> bool:
+                sign = der - 1
+                moved = table.nexts[idx] if sign > 0 else table.prevs[idx] if sign < 0 else idx
+                return choice == moved or (choice == idx and not table.points[idx])
+            magnitude_parts.append(self.table_relation([f.magnitude, f.derivative, f.choice], choice_ok))
+            # handle_correspondence: force targets of corresponding choices,
+            # with no two corresponding choices forcing different values
+            forced = {}
+            for (qa, va, vb) in plan.forcing[q]:
+                forced[vb] = bdd.or_(forced.get(vb, FALSE), self.equals(fields[qa].choice, va))
+            unforced = bdd.conjoin(bdd.not_(trigger) for trigger in forced.values())
+            magnitude_parts.append(bdd.disjoin([
+                bdd.and_(unforced, self.table_relation([f.choice, f.next_magnitude], lambda choice, magnitude: magnitude == choice)),
+                *(bdd.conjoin([trigger, self.equals(f.next_magnitude, vb), *(bdd.not_(other) for wb, other in forced.items() if wb != vb)])
+                  for vb, trigger in forced.items())]))
+            # check_continuous on the magnitude
+            magnitude_parts.append(self.table_relation([f.magnitude, f.next_magnitude], lambda a, b: abs(a - b) <= 1))
+        # check_point_range: points and ranges do not change in one step
+        point_changed = bdd.disjoin(
+            self.table_relation([f.magnitude, f.next_magnitude], lambda a, b, table=table: a != b and table.points[a])
+            for table, f in zip(tables, fields))
+        range_changed = bdd.disjoin(
+            self.table_relation([f.magnitude, f.next_magnitude], lambda a, b, table=table: a != b and not table.points[a])
+            for table, f in zip(tables, fields))
+        magnitude_parts.append(bdd.not_(bdd.and_(point_changed, range_changed)))
+        choices = frozenset(x for f in fields for x in f.choice.vars)
+        magnitudes = bdd.exists(bdd.conjoin(magnitude_parts), choices)
+
+        derivative_parts = []
+        for q, (table, f) in enumerate(zip(tables, fields)):
+            # influences act on the successor magnitudes
+            def influenced_ok(der: int, magnitude: int, influenced: int, effect: int, table=table) -> bool:
+                return influenced - 1 in clip_signs(table, magnitude, SIGN_MOVES[(der - 1, effect)])
+            derivative_parts.append(self.effect_relation(
+                [f.derivative, f.next_magnitude, f.influenced],
+                [(fields[qa].next_magnitude, tuple(correlation * sign for sign in tables[qa].signs)) for (qa, correlation) in plan.influences[q]],
+                influenced_ok))
+            # proportionalities act on the influenced derivatives; derivatives may not flip sign
+            def derivative_ok(der: int, magnitude: int, influenced: int, next_der: int, effect: int, table=table) -> bool:
+                return (next_der - 1) * (der - 1) != -1 and next_der - 1 in clip_signs(table, magnitude, SIGN_MOVES[(influenced - 1, effect)])
+            derivative_parts.append(self.effect_relation(
+                [f.derivative, f.next_magnitude, f.influenced, f.next_derivative],
+                [(fields[qa].influenced, (-correlation, 0, correlation)) for (qa, correlation) in plan.proportionals[q]],
+                derivative_ok))
+        influenced = frozenset(x for f in fields for x in f.influenced.vars)
+        derivatives = bdd.exists(bdd.conjoin(derivative_parts), influenced)
+        # check_not_equal
+        unchanged = bdd.conjoin(
+            bdd.ite(bdd.ithvar(x), bdd.ithvar(y), bdd.not_(bdd.ithvar(y)))
+            for x, y in zip(self.current, self.next))
+        return bdd.conjoin([magnitudes, derivatives, bdd.not_(unchanged)])
+
+    # state sets
+
+    def states(self, entity_states: Iterable[EntityState]) -> int:
+        '''the set of some explicit states'''
+        return self.codes(encode_state(state) for state in entity_states)
+
+    def codes(self, codes: Iterable[int]) -> int:
+        '''the set of some packed states'''
+        fields = [field for f in self.fields for field in (f.magnitude, f.derivative)]
+        return self.relation(fields, (tuple(x for idx, sign in unpack(self.codec, code) for x in (idx, sign + 1)) for code in codes))
+
+    def image(self, s: int) -> int:
+        '''the successors of a set of states'''
+        successors = self.bdd.and_exists(s, self.transition, frozenset(self.current))
+        return self.bdd.rename(successors, self.to_current)
+
+    def reachable(self, s: int, max_steps: Optional[int] = None) -> int:
+        '''the states reachable from a set of states, by breadth-first image
+           computation on the frontier until a fixpoint (or max_steps images)'''
+        bdd = self.bdd
+        reached = frontier = s
+        steps = 0
+        while frontier != FALSE and (max_steps is None or steps < max_steps):
+            new = self.image(frontier)
+            frontier = bdd.and_(new, bdd.not_(reached))
+            reached = bdd.or_(reached, new)
+            steps += 1
+        return reached
+
+    def count(self, s: int) -> int:
+        '''the number of states in a set'''
+        return self.bdd.count(s, self.current)
+
+    def count_edges(self, s: int) -> int:
+        '''the number of transitions out of a set of states'''
+        return self.bdd.count(self.bdd.and_(s, self.transition), self.current + self.next)
+
+    def packed(self, s: int) -> Iterator[int]:
+        '''the packed codes of the states in a set'''
+        for assignment in self.bdd.assignments(s, self.current):
+            pairs = []
+            for f in self.fields:
+                idx = sum(assignment[x] << i for i, x in enumerate(f.magnitude.vars))
+                der = sum(assignment[x] << i for i, x in enumerate(f.derivative.vars))
+                pairs.append((idx, der - 1))
+            yield pack(self.codec, tuple(pairs))
+
+    def decode(self, s: int, limit: Optional[int] = None) -> Iterator[EntityState]:
+        '''the explicit states of a set, at most limit of them'''
+        for code in itertools.islice(self.packed(s), limit):
+            yield decode_state(self.codec, code)
+
+def symbolic_envisionment(entity: Entity) -> Tuple[SymbolicEntity, int]:
+    '''the states reachable from every valid state, as gen_full_envisionment
+       but as a symbolic set'''
+    sym = SymbolicEntity(entity)
+    return (sym, sym.reachable(sym.valid))
@@ -0,0 +1,266 @@
+'''systems of entities, coupled by relations between quantities of different
+   entities.
+
+   the quantities of a system are named `entity.quantity`, and its state graph
+   is over one flattened entity of all of them, equal to exploring that entity
+   directly. successors are not generated over all quantities at once though:
+   each entity is a factor whose moves are generated and memoized per entity
+   state and the few values it reads from other entities (a magnitude choice,
+   sign or influenced derivative per cross-entity relation). a system state's
+   successors join the moves of its entities on those values, so coupled
+   entities, like a chain of containers, cost the moves of each container
+   rather than of their product.'''
+
+from dataclasses import dataclass, field, replace
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from qr import *
+
+import instrument
+import itertools
+import memo
+
+def qualified(entity: Entity, k: str) -> Quantity:
+    '''the quantity k of an entity as named in a system'''
+    return Quantity(f"{entity.name}.{k}", entity.quantities[k].quantitySpace)
+
+def relation_quantities(relation: Relation) -> Tuple[str, str]:
+    '''the names of the quantities a relation links'''
+    if isinstance(relation, ValueCorrespondence):
+        return (relation.a[0], relation.b[0])
+    return (relation.a.name, relation.b.name)
+
+def qualify_relation(entity: Entity, relation: Relation) -> Relation:
+    '''a relation within an entity, on the system names of its quantities'''
+    if isinstance(relation, ValueCorrespondence):
+        return ValueCorrespondence((f"{entity.name}.{relation.a[0]}", relation.a[1]), (f"{entity.name}.{relation.b[0]}", relation.b[1]))
+    return replace(relation, a=qualified(entity, relation.a.name), b=qualified(entity, relation.b.name))
+
+@dataclass(frozen=True)
+class System:
+    name: str
+    entities: Dict[str, Entity]
+    # cross-entity relations, on qualified quantity names (see qualified)
+    relations: List[Relation]
+    # entity names of each coupled component, filled in by make_system
+    components: Tuple[Tuple[str, ...], ...] = field(default=(), compare=False, repr=False)
+    # the flattened entity of the whole system
+    entity: Optional[Entity] = field(default=None, compare=False, repr=False)
+
+def make_system(name: str, entities: List[Entity], relations: List[Relation]) -> System:
+    '''make a system of entities, checking the relations between them and
+       grouping the entities into coupled components'''
+    by_name = {}
+    for entity in entities:
+        if entity.name in by_name:
+            raise ValueError(f"duplicate entity name: {entity.name}")
+        by_name[entity.name] = entity
+    owner = {f"{entity.name}.{k}": entity.name for entity in entities for k in entity.quantities}
+    for relation in relations:
+        for k in relation_quantities(relation):
+            if k not in owner:
+                raise ValueError(f"unknown system quantity: {k}")
+    components = coupled_components(list(by_name), [tuple(owner[k] for k in relation_quantities(relation)) for relation in relations])
+    entity = flatten(name, [by_name[k] for names in components for k in names], relations)
+    return System(name, by_name, relations, components, entity)
+
+def coupled_components(names: List[str], links: Iterable[Tuple[str, str]]) -> Tuple[Tuple[str, ...], ...]:
+    '''the connected components of entities under links, each in entity order,
+       ordered by their first entity'''
+    parent = {k: k for k in names}
+
+    def root(k: str) -> str:
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+    for (a, b) in links:
+        parent[root(a)] = root(b)
+    groups = {}
+    for k in names:
+        groups.setdefault(root(k), []).append(k)
+    return tuple(tuple(group) for group in groups.values())
+
+def flatten(name: str, entities: List[Entity], relations: List[Relation]) -> Entity:
+    '''one entity of the qualified quantities and relations of some entities,
+       plus relations between them'''
+    return make_entity(
+        name,
+        [qualified(entity, k) for entity in entities for k in entity.quantities],
+        [*(qualify_relation(entity, relation) for entity in entities for relation in entity.relations), *relations],
+        {f"{entity.name}.{k}": exogenous for entity in entities for k, exogenous in entity.exogenous_dict.items()})
+
+def make_system_state(system: System, states: Dict[str, EntityState]) -> EntityState:
+    '''the system state of a state per entity name'''
+    return EntityState(system.entity, {
+        f"{name}.{k}": states[name].state[k]
+        for names in system.components for name in names for k in system.entities[name].quantities})
+
+def split_state(system: System, state: EntityState) -> Dict[str, EntityState]:
+    '''the state of each entity in a system state'''
+    return {
+        name: EntityState(entity, {k: state.state[f"{name}.{k}"] for k in entity.quantities})
+        for name, entity in system.entities.items()}
+
+@dataclass(frozen=True)
+class Factor:
+    '''the quantities of one entity within the packed system state, with the
+       values it reads from (imports) and gives to (exports) other entities:
+       ('choice', q) a magnitude choice, for value correspondences; ('sign', q)
+       a next magnitude sign, for influences; ('derivative', q) a derivative
+       after influences, for proportionals. q is a system quantity position.'''
+    positions: Tuple[int, ...]
+    shift: int
+    mask: int
+    imports: Tuple[Tuple[str, int], ...]
+    exports: Tuple[Tuple[str, int], ...]
+
+def system_factors(system: System) -> Tuple[Factor, ...]:
+    '''the factor of each entity, in system quantity order'''
+    codec = entity_codec(system.entity)
+    plan = successor_plan(codec)
+    factors = []
+    position = 0
+    for names in system.components:
+        for name in names:
+            positions = tuple(range(position, position + len(system.entities[name].quantities)))
+            position += len(positions)
+            (first, last) = (positions[0], positions[-1])
+            width = codec.shifts[last] + codec.masks[last].bit_length() - codec.shifts[first]
+            imports = sorted({
+                *(('choice', qa) for qb in positions for (qa, _, _) in plan.forcing[qb]),
+                *(('sign', qa) for qb in positions for (qa, _) in plan.influences[qb]),
+                *(('derivative', qa) for qb in positions for (qa, _) in plan.proportionals[qb]),
+            } - {(kind, q) for kind in ('choice', 'sign', 'derivative') for q in positions})
+            factors.append(Factor(positions, codec.shifts[first], (1 << width) - 1, tuple(imports), ()))
+    exported = {key for factor in factors for key in factor.imports}
+    return tuple(
+        replace(factor, exports=tuple(key for key in sorted(exported) if key[1] in factor.positions))
+        for factor in factors)
+
+def factor_moves(codec: StateCodec, factor: Factor, source: Tuple[Tuple[int, int], ...], imports: Dict[Tuple[str, int], int]) -> Tuple[Tuple[int, int, Tuple[int, ...]], ...]:
+    '''packed_moves restricted to the quantities of one factor, reading the
+       values of other entities from imports: each move as its packed target
+       bits, its kind of magnitude change and the values of its exports'''
+    plan = successor_plan(codec)
+    tables = codec.tables
+    positions = factor.positions
+    moves = set()
+    choice_options = []
+    for q in positions:
+        (idx, sign) = source[q]
+        table = tables[q]
+        moved = table.nexts[idx] if sign > 0 else table.prevs[idx] if sign < 0 else idx
+        choice_options.append((moved,) if table.points[idx] or moved == idx else (moved, idx))
+    for choices in itertools.product(*choice_options):
+        choice = dict(zip(positions, choices))
+        magnitudes = {}
+        kind = 0
+        for qb in positions:
+            # as in packed_moves: correspondences, continuity, point-before-range
+            reqs = {vb for (qa, va, vb) in plan.forcing[qb] if (choice[qa] if qa in choice else imports[('choice', qa)]) == va}
+            if len(reqs) > 1:
+                break
+            magnitude = reqs.pop() if reqs else choice[qb]
+            before = source[qb][0]
+            if abs(magnitude - before) > 1:
+                break
+            if magnitude != before:
+                kind |= POINT_CHANGED if tables[qb].points[before] else RANGE_CHANGED
+            magnitudes[qb] = magnitude
+        else:
+            if kind == POINT_CHANGED | RANGE_CHANGED:
+                continue
+            signs = {q: tables[q].signs[magnitudes[q]] for q in positions}
+            direct_options = [
+                clip_signs(tables[qb], magnitudes[qb], SIGN_MOVES[(source[qb][1], combine_signs(
+                    correlation * (signs[qa] if qa in signs else imports[('sign', qa)]) for (qa, correlation) in plan.influences[qb]))])
+                for qb in positions]
+            for derivatives1 in itertools.product(*direct_options):
+                influenced = dict(zip(positions, derivatives1))
+                derivative_options = []
+                for qb in positions:
+                    effect = combine_signs(correlation * (influenced[qa] if qa in influenced else imports[('derivative', qa)]) for (qa, correlation) in plan.proportionals[qb])
+                    options = tuple(option for option in clip_signs(tables[qb], magnitudes[qb], SIGN_MOVES[(influenced[qb], effect)]) if option * source[qb][1] != -1)
+                    if not options:
+                        break
+                    derivative_options.append(options)
+                else:
+                    values = {'choice': choice, 'sign': signs, 'derivative': influenced}
+                    exports = tuple(values[k][q] for (k, q) in factor.exports)
+                    for derivatives2 in itertools.product(*derivative_options):
+                        target = 0
+                        for q, derivative in zip(positions, derivatives2):
+                            target |= (magnitudes[q] * 3 + derivative + 1) << codec.shifts[q]
+                        moves.add((target, kind, exports))
+    return tuple(sorted(moves))
+
+def system_successors(system: System, maxsize: int = 100000) -> Callable[[int], Set[int]]:
+    '''the successor function of packed system states. the moves of each entity
+       (factor_moves) are memoized per entity state and imported values, in the
+       active memo (see memo.enable_memo) or else in a memo of its own of
+       maxsize entries, and joined where one entity's imports are another's
+       exports. as in packed_moves, no quantity may leave a point while another
+       leaves a range, across all entities, and the state must change.'''
+    codec = entity_codec(system.entity)
+    factors = system_factors(system)
+    both = POINT_CHANGED | RANGE_CHANGED
+    cache = memo.MEMO if memo.MEMO is not None else memo.TransitionMemo(maxsize)
+    entity = system.entity
+
+    def successors(code: int) -> Set[int]:
+        source = unpack(codec, code)
+        options = set()
+        # moves by factor and imports, for this state
+        looked_up = {}
+
+        def domain(key: Tuple[str, int]) -> Iterable[int]:
+            # an import from a later entity: try its possible values, matched
+            # against that entity's exports once it is chosen
+            (kind, q) = key
+            return range(max(0, source[q][0] - 1), min(len(codec.tables[q].signs), source[q][0] + 2)) if kind == 'choice' else (-1, 0, 1)
+
+        def join(i: int, target: int, kind: int, values: Dict[Tuple[str, int], int]) -> None:
+            if i == len(factors):
+                if target != code:
+                    options.add(target)
+                return
+            factor = factors[i]
+            unknown = [key for key in factor.imports if key not in values]
+            for assumed in itertools.product(*map(domain, unknown)):
+                known = {**values, **dict(zip(unknown, assumed))}
+                imports = tuple(known[key] for key in factor.imports)
+                moves = looked_up.get((i, imports))
+                if moves is None:
+                    key = ('system_successors', i, (code >> factor.shift) & factor.mask, imports)
+                    moves = cache.get(key, entity)
+                    if moves is None:
+                        moves = factor_moves(codec, factor, source, dict(zip(factor.imports, imports)))
+                        cache.put(key, entity, moves)
+                    looked_up[(i, imports)] = moves
+                for (move, move_kind, exports) in moves:
+                    if kind | move_kind == both or any(known.get(k, v) != v for k, v in zip(factor.exports, exports)):
+                        continue
+                    join(i + 1, target | move, kind | move_kind, {**known, **dict(zip(factor.exports, exports))})
+        join(0, 0, 0, {})
+        return options
+    return successors
+
+def gen_system_graph(
+    system: System,
+    states: Dict[str, EntityState],
+    order: str = 'dfs',
+    max_depth: Optional[int] = None,
+    max_states: Optional[int] = None,
+    progress: Optional[Callable[[ExploreStats], None]] = None,
+    progress_every: int = 1000,
+    compat_keys: bool = True) -> StateGraph:
+    '''explore the system states reachable from a state per entity name, as
+       gen_state_graph on the flattened system entity (see its options), with
+       successors from system_successors'''
+    codec = entity_codec(system.entity)
+    seeds = [encode_state(make_system_state(system, states))]
+    (nodes, edges, stats) = explore_packed(codec, seeds, order, max_depth, max_states, progress, progress_every, system_successors(system))
+    (sg, _) = decode_graph(codec, nodes, edges, stats, compat_keys)
+    if instrument.PROFILE is not None:
+        stats.profile = instrument.profile_summary()
+    return sg
@@ -0,0 +1,50 @@
+from analysis import *
+from export import *
+from qr import *
+from container import *
+from mock import *
+
+import pygraphviz as pgv
+
+# a -> b <-> c -> d, a -> e <-> f: a steady state d, a cycle e/f, a transient cycle b/c
+sg = StateGraph(dict.fromkeys('abcdef'), [('a', 'b'), ('b', 'c'), ('c', 'b'), ('c', 'd'), ('a', 'e'), ('e', 'f'), ('f', 'e')])
+
+def test_condensation():
+    cond = condensation(sg)
+    groups = sorted(sorted(sg.keys[v] for v in nodes) for nodes in cond.members)
+    assert groups == [['a'], ['b', 'c'], ['d'], ['e', 'f']]
+    assert all(cond.component[a] >= cond.component[b] for a, b in sg.edge_ids())
+    a = cond.component[sg.ids['a']]
+    assert sorted(cond.successors(a)) == sorted({cond.component[sg.ids['b']], cond.component[sg.ids['e']]})
+    assert sorted(len(cond.members[c]) for c in terminal_components(cond)) == [1, 2]
+    assert [sg.keys[v] for c in source_components(cond) for v in cond.members[c]] == ['a']
+
+def test_basins():
+    cond = condensation(sg)
+    (d, e) = (cond.component[sg.ids['d']], cond.component[sg.ids['e']])
+    keys = lambda nodes: ''.join(sg.keys[v] for v in nodes)
+    assert {keys(cond.members[t]): keys(nodes) for t, nodes in basins(cond).items()} == {'d': 'abcd', 'ef': 'aef'}
+    assert {keys(cond.members[t]): keys(nodes) for t, nodes in basins(cond, strict=True).items()} == {'d': 'bcd', 'ef': 'ef'}
+    assert attractor_reach(cond)[cond.component[sg.ids['a']]] == 0b11
+
+def test_shortest_path():
+    assert [sg.keys[v] for v in shortest_path(sg, 'a', 'd')] == ['a', 'b', 'c', 'd']
+    assert shortest_path(sg, 'd', 'a') is None
+    assert shortest_path(sg, 'e', 'e') == [sg.ids['e']]
+
+def test_envisionment():
+    env = gen_full_envisionment(container)
+    cond = condensation(env.graph)
+    assert (len(cond.members), len(terminal_components(cond))) == (60, 5)
+    # every state ends up in some attractor; strict basins do not overlap
+    assert set(v for nodes in basins(cond).values() for v in nodes) == set(range(len(env.graph.keys)))
+    strict = [v for nodes in basins(cond, strict=True).values() for v in nodes]
+    assert len(strict) == len(set(strict))
+
+def test_component_colors():
+    g = gen_state_graph(entity_state)
+    colors = component_colors(condensation(g))
+    # the container cycles through 16 of its 17 states
+    assert sorted(colors.values()) == [CYCLE_COLOR] * 16
+    A = pgv.AGraph(string=dot_source(g, 'none', colors))
+    assert sum(A.get_node(k).attr['fillcolor'] == CYCLE_COLOR for k in g.keys) == 16
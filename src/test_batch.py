@@ -0,0 +1,32 @@
+from batch import *
+from prune import *
+from mock import *
+
+import itertools
+
+def all_container_states():
+    names = list(container.quantities)
+    pairs = [[(m, d) for m in container.quantities[k].quantitySpace for d in (Direction.NEGATIVE, Direction.NEUTRAL, Direction.POSITIVE)] for k in names]
+    return [EntityState(container, {k: QuantityPair(*pair) for k, pair in zip(names, combo)}) for combo in itertools.product(*pairs)]
+
+def test_masks_match_pairwise_checks():
+    codec = entity_codec(container)
+    states = all_container_states()
+    candidates = encode_candidates(codec, states)
+    assert candidates.shape == (486, 3)
+    checks = [
+        (transition_mask, check_transition),
+        (continuous_mask, check_continuous),
+        (point_range_mask, check_point_range),
+        (not_equal_mask, check_not_equal),
+        (magnitudes_match_mask, magnitudes_match),
+        (derivatives_match_mask, derivatives_match),
+    ]
+    for source in states[::25]:
+        for mask_fn, check in checks:
+            assert list(mask_fn(codec, source, candidates)) == [check(source, b) for b in states]
+
+def test_derivative_candidates():
+    codec = entity_codec(container)
+    matrix = derivative_candidates(codec, entity_state, [{'inflow': Direction.NEGATIVE, 'outflow': Direction.NEUTRAL, 'volume': Direction.POSITIVE}])
+    assert matrix.tolist() == [[0, 1, 2]]
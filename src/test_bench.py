@@ -0,0 +1,39 @@
+from bench import *
+
+import copy
+import os
+import pytest
+
+def test_synthetic_entity():
+    entity = synthetic_entity(4, 'chain', space_size=5, influence_density=1, proportional_density=0, correspondence_density=1)
+    assert list(entity.quantities) == ['q0', 'q1', 'q2', 'q3']
+    assert len(list(entity.quantities['q0'].quantitySpace)) == 5
+    assert len(entity.relations) == 3 * 3
+    mesh = synthetic_entity(4, 'mesh', influence_density=1, proportional_density=1, correspondence_density=0)
+    assert len(mesh.relations) == 2 * 6
+
+def test_bench_entity():
+    result = bench_entity(synthetic_entity(3), repeat=1, sample=10)
+    assert result['model']['states'] == 86
+    assert set(result['benchmarks']) == {'gen_full_envisionment', 'gen_state_graph', 'next_states', 'gen_dot', 'intra_state_trace', 'inter_state_trace'}
+    assert result['benchmarks']['next_states']['count'] == 10
+
+def test_compare():
+    old = run_benchmarks([3], repeat=1, topology='chain')
+    new = copy.deepcopy(old)
+    assert compare(old, new) == []
+    new['results'][0]['benchmarks']['gen_dot']['seconds'] *= 2
+    assert len(compare(old, new)) == 1
+    with pytest.raises(ValueError):
+        compare(old, run_benchmarks([3], repeat=1, topology='mesh'))
+
+def test_main_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert main(['--sizes', '3', '--repeat', '1']) == 0
+    assert os.listdir(tmp_path) == []
+    assert main(['--sizes', '3', '--repeat', '1', '--out', 'bench.json']) == 0
+    assert os.listdir(tmp_path) == ['bench.json']
+    with pytest.raises(ValueError):
+        measure(lambda: 1, 0)
+    with pytest.raises(SystemExit):
+        main(['--repeat', '0'])
@@ -0,0 +1,59 @@
+from export import *
+from qr import *
+from mock import *
+
+import io
+import json
+import pygraphviz as pgv
+import xml.etree.ElementTree as ET
+
+sg = gen_state_graph(entity_state)
+
+def test_dot_matches_gen_dot():
+    from graph import gen_dot
+    A = gen_dot(sg.states, sg.edges, 'id')
+    B = pgv.AGraph(string=dot_source(sg, 'id'))
+    assert set(A.nodes()) == set(B.nodes())
+    assert set(A.edges()) == set(B.edges())
+    for node in A.nodes():
+        assert A.get_node(node).attr['label'] == B.get_node(node).attr['label']
+        assert A.get_node(node).attr['tooltip'] == B.get_node(node).attr['tooltip']
+    for edge in A.edges():
+        assert A.get_edge(*edge).attr['tooltip'] == B.get_edge(*edge).attr['tooltip']
+
+def test_json():
+    f = io.StringIO()
+    write_json(sg, f)
+    doc = json.loads(f.getvalue())
+    assert [node['key'] for node in doc['nodes']] == sg.keys
+    assert [(link['source'], link['target']) for link in doc['links']] == list(sg.edge_ids())
+
+def test_graphml():
+    f = io.StringIO()
+    write_graphml(sg, f)
+    graph = ET.fromstring(f.getvalue())[2]
+    ns = '{http://graphml.graphdrawing.org/xmlns}'
+    assert len(graph.findall(f'{ns}node')) == 17
+    assert len(graph.findall(f'{ns}edge')) == 37
+
+def test_write_graph(tmp_path):
+    path = str(tmp_path / 'graph.json')
+    write_graph(sg, path)
+    with open(path) as f:
+        assert len(json.load(f)['nodes']) == 17
+
+def test_exogenous_edges():
+    exo = gen_state_graph(entity_state, exogenous=True)
+    assert dot_source(exo, 'none').count('[style="dashed"]') == len(exo.exogenous_edges)
+    assert dot_source(exo, 'id').count('[style="dashed", tooltip=') == len(exo.exogenous_edges)
+    doc = json.loads(''.join(iter_json(exo)))
+    assert {(link['source'], link['target']) for link in doc['links'] if link.get('label') == EXOGENOUS} == exo.exogenous_edges
+    graph = ET.fromstring(''.join(iter_graphml(exo)))[3]
+    ns = '{http://graphml.graphdrawing.org/xmlns}'
+    assert len(graph.findall(f'{ns}edge/{ns}data')) == len(exo.exogenous_edges)
+
+def test_dot_quote():
+    # graphviz unescapes quotes when parsing and backslashes when drawing labels
+    for s in ['a"b', 'a\\b', 'a\\"b', 'a\\']:
+        A = pgv.AGraph(string=f"digraph {{ n [label={dot_quote(s)}] }}")
+        assert A.get_node('n').attr['label'] == s.replace('\\', '\\\\')
@@ -0,0 +1,86 @@
+from incremental import *
+from qr import *
+from container import *
+from mock import *
+
+import pytest
+
+def swapped(entity, old, new):
+    relations = [new if relation == old else relation for relation in entity.relations]
+    return make_entity(entity.name, list(entity.quantities.values()), relations, entity.exogenous_dict)
+
+def test_diff_entities():
+    entity = swapped(bonus_container, pressure_outflow, volume_outflow)
+    diff = diff_entities(bonus_container, entity)
+    assert (diff.added, diff.removed, diff.quantities_changed) == ((volume_outflow,), (pressure_outflow,), False)
+    assert not diff_entities(bonus_container, bonus_container)
+
+def check_reenvision(entity):
+    sg = gen_state_graph(bonus_entity_state)
+    (patched, patch) = reenvision(sg, entity)
+    full = gen_state_graph(EntityState(entity, bonus_entity_state.state))
+    assert set(patched.keys) == set(full.keys)
+    assert set(patched.edges) == set(full.edges)
+    assert set(patch.added_states) == set(full.keys) - set(sg.keys)
+    assert set(patch.removed_states) == set(sg.keys) - set(full.keys)
+    assert set(patch.added_edges) == set(full.edges) - set(sg.edges)
+    assert set(patch.removed_edges) == set(sg.edges) - set(full.edges)
+    return patch
+
+def test_reenvision_swap():
+    patch = check_reenvision(swapped(bonus_container, pressure_outflow, volume_outflow))
+    # the outflow follows pressure and volume alike where both derivatives
+    # are bound to be equal
+    assert patch.reused > 0
+
+def test_reenvision_envisionment():
+    entity = swapped(bonus_container, pressure_outflow, volume_outflow)
+    env = gen_full_envisionment(bonus_container)
+    (patched, patch) = reenvision(env, entity)
+    full = gen_full_envisionment(entity)
+    assert set(patched.seeds) == set(full.seeds)
+    assert set(patched.graph.keys) == set(full.graph.keys)
+    assert set(patched.graph.edges) == set(full.graph.edges)
+    assert patch.reused > 0
+    # a graph explored from several seeds is re-explored from all of them
+    states = [full.graph.states[k] for k in (full.seeds[0], full.seeds[-1])]
+    sg = decode_graph(entity_codec(bonus_container), [encode_state(EntityState(bonus_container, state.state)) for state in states], [])[0]
+    (patched, patch) = reenvision(sg, entity)
+    assert set(patched.keys) == {k for state in states for k in gen_state_graph(state).keys}
+
+def test_reenvision_reuse():
+    # dropping a value correspondence leaves states far from its values alone
+    relations = [relation for relation in bonus_container.relations if relation != vol_hi_max]
+    entity = make_entity(bonus_container.name, list(bonus_container.quantities.values()), relations, bonus_container.exogenous_dict)
+    patch = check_reenvision(entity)
+    assert patch.reused > 0
+
+def test_reenvision_unchanged():
+    sg = gen_state_graph(entity_state)
+    (patched, patch) = reenvision(sg, container)
+    assert patched.keys == sg.keys and patched.edges == sg.edges
+    assert (patch.recomputed, patch.reused) == (0, 17)
+
+def test_reenvision_truncated():
+    sg = gen_state_graph(entity_state, max_depth=2)
+    (patched, patch) = reenvision(sg, container)
+    full = gen_state_graph(entity_state)
+    assert set(patched.keys) == set(full.keys) and set(patched.edges) == set(full.edges)
+    assert (patch.recomputed, patch.reused) == (17, 0)
+
+def test_reenvision_exogenous():
+    relations = [relation for relation in bonus_container.relations if relation != vol_hi_max]
+    entity = make_entity(bonus_container.name, list(bonus_container.quantities.values()), relations, bonus_container.exogenous_dict)
+    sg = gen_state_graph(bonus_entity_state, exogenous=True)
+    with pytest.raises(ValueError):
+        reenvision(sg, entity)
+    (patched, patch) = reenvision(sg, entity, exogenous=True)
+    full = gen_state_graph(EntityState(entity, bonus_entity_state.state), exogenous=True)
+    assert full.exogenous_edges
+    labels = lambda g: {(g.keys[a], g.keys[b], g.edge_label(a, b)) for a, b in g.edge_ids()}
+    assert labels(patched) == labels(full)
+    assert patch.reused > 0
+    # a graph explored without exogenous edges has none to reuse
+    (patched, patch) = reenvision(gen_state_graph(bonus_entity_state), entity, exogenous=True)
+    assert labels(patched) == labels(full)
+    assert patch.reused == 0
@@ -0,0 +1,40 @@
+from instrument import *
+from qr import *
+from mock import *
+
+import json
+import prune
+
+def test_profiling_disabled_by_default():
+    assert profile_summary() is None
+    assert gen_state_graph(entity_state).stats.profile is None
+
+def test_profiling_keeps_results():
+    reference = gen_state_graph(bonus_entity_state)
+    expected = next_states(bonus_entity_state)
+    enable_profiling()
+    try:
+        sg = gen_state_graph(bonus_entity_state)
+        assert next_states(bonus_entity_state) == expected
+    finally:
+        profile = disable_profiling()
+    assert sg.keys == reference.keys and sg.edges == reference.edges
+    summary = profile.summary()
+    assert summary['timers']['next_packed_states']['calls'] == 162
+    assert summary['timers']['next_states']['calls'] == 1
+    assert summary['counters']['packed_magnitudes.candidates'] > summary['counters']['packed_magnitudes.pruned.continuous']
+    assert summary['stages']['check_transition']['pruned'] == summary['stages']['derivative_states']['pruned']
+    assert sg.stats.profile['timers']['next_packed_states']['calls'] == 162
+    json.dumps(summary)
+
+def test_profiled_wrapper():
+    enable_profiling()
+    try:
+        prune.check_transition(bonus_entity_state, bonus_entity_state)
+    finally:
+        profile = disable_profiling()
+    assert profile.timers['check_transition'][0] == 1
+    assert prune.check_transition.__name__ == 'check_transition'
+    # disabled, the wrapper records nothing
+    prune.check_transition(bonus_entity_state, bonus_entity_state)
+    assert profile.timers['check_transition'][0] == 1
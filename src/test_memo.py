@@ -0,0 +1,61 @@
+from memo import *
+from prune import *
+from mock import *
+from qr import gen_state_graph
+
+def test_memo_disabled_by_default():
+    assert memo_stats() is None
+    assert next_states(entity_state) == next_states(entity_state)
+
+def test_memo_hits():
+    enable_memo(maxsize=10)
+    try:
+        first = next_states(entity_state)
+        assert next_states(entity_state) == first
+        stats = memo_stats()
+        # the first call also memoizes the derivative_states it ran
+        assert (stats['hits'], stats['misses'], stats['size']) == (1, 2, 2)
+        # results are copies, so callers can't corrupt the cache
+        first.clear()
+        assert next_states(entity_state) != first
+    finally:
+        disable_memo()
+
+def test_memo_lru_eviction():
+    codec = entity_codec(container)
+    codes = [encode_state(s) for s in list(gen_state_graph(entity_state).states.values())[:4]]
+    memo = enable_memo(maxsize=2)
+    try:
+        for code in codes:
+            next_packed_states(codec, code)
+        stats = memo.stats()
+        assert (stats['hits'], stats['misses'], stats['evictions'], stats['size']) == (0, len(codes), len(codes) - 2, 2)
+        # the most recent entry is still cached
+        next_packed_states(codec, codes[-1])
+        assert (memo.hits, memo.misses) == (1, len(codes))
+        # the first one was evicted, so it is computed again
+        next_packed_states(codec, codes[0])
+        assert (memo.hits, memo.misses) == (1, len(codes) + 1)
+        assert memo.stats()['size'] == 2
+    finally:
+        disable_memo()
+
+def test_invalidate_entity():
+    entity = make_entity('container', quantities, list(relations), {})
+    es = make_entity_state(entity, {
+        'volume': (Volume.ZERO, Direction.NEUTRAL),
+        'inflow': (Inflow.ZERO, Direction.NEUTRAL),
+        'outflow': (Outflow.ZERO, Direction.POSITIVE),
+    })
+    enable_memo()
+    try:
+        before = next_states(es)
+        # without this, outflow is no longer held at zero by the empty volume
+        entity.relations.remove(vol_out_zero)
+        size = memo_stats()['size']
+        assert size > 0
+        assert invalidate_entity(entity) == size
+        assert next_states(es) != before
+        assert memo_stats()['hits'] == 0
+    finally:
+        disable_memo()
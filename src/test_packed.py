@@ -0,0 +1,35 @@
+from packed import *
+from mock import *
+
+import pytest
+
+def test_encode_decode_state():
+    codec = entity_codec(container)
+    code = encode_state(entity_state)
+    assert isinstance(code, int)
+    assert decode_state(codec, code) == entity_state
+
+def test_pack_unpack():
+    codec = entity_codec(bonus_container)
+    pairs = ((1, 1), (2, -1), (0, 0), (2, 0), (1, -1))
+    assert unpack(codec, pack(codec, pairs)) == pairs
+
+def test_codec_layout():
+    codec = entity_codec(container)
+    assert codec.names == ('inflow', 'outflow', 'volume')
+    # inflow: 2 magnitudes * 3 derivatives fit in 3 bits, the others need 4
+    assert codec.shifts == (0, 3, 7)
+    assert entity_codec(container) is codec
+    # the codec is a declared cache field, ignored in comparisons
+    assert container.codec is codec and successor_plan(codec) is codec.plan
+    assert container == make_entity('container', quantities, relations, exogenous)
+
+def test_encode_invalid_state():
+    # pressure holding a Volume magnitude
+    invalid = make_entity_state(bonus_container, {**bonus_container_state, 'pressure': (Volume.ZERO, Direction.NEUTRAL)})
+    with pytest.raises(ValueError, match='Volume.ZERO is not in the quantity space of pressure'):
+        encode_state(invalid)
+    with pytest.raises(ValueError):
+        gen_state_graph(invalid)
+    with pytest.raises(ValueError, match='no quantity volume'):
+        encode_state(EntityState(container, {k: pair for k, pair in entity_state.state.items() if k != 'volume'}))
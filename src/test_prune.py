@@ -391,3 +391,71 @@ def test_check_transition():
     entity_state_before = make_entity_state(container, container_state_before)
     entity_state_after = make_entity_state(container, container_state_after)
     assert check_transition(entity_state_before, entity_state_after) == True
+
+def test_next_packed_states():
+    codec = entity_codec(container)
+    names = list(container.quantities)
+    spaces = [list(container.quantities[k].quantitySpace) for k in names]
+    pairs = [[(m, d) for m in space for d in (Direction.NEGATIVE, Direction.NEUTRAL, Direction.POSITIVE)] for space in spaces]
+    for combo in itertools.product(*pairs):
+        es = EntityState(container, {k: QuantityPair(*pair) for k, pair in zip(names, combo)})
+        packed = next_packed_states(codec, encode_state(es))
+        assert {decode_state(codec, code) for code in packed} == next_states(es)
+
+def test_entity_effects():
+    for es in (entity_state, make_entity_state(container, {
+        'volume': (Volume.PLUS, Direction.POSITIVE),
+        'inflow': (Inflow.PLUS, Direction.NEUTRAL),
+        'outflow': (Outflow.PLUS, Direction.NEGATIVE),
+    })):
+        for is_direct in (True, False):
+            assert entity_effects(container, es.state, is_direct) == relation_effects(es.state, container.relations, is_direct)
+
+def test_relation_index():
+    index = entity_relations(container)
+    assert index.influences == {'volume': [inflow_volume, outflow_volume]}
+    assert index.proportionals == {'outflow': [volume_outflow]}
+    assert index.correspondences[('volume', Volume.MAX)] == [vol_out_max]
+    assert index.correspondents[('outflow', Outflow.ZERO)] == [vol_out_zero]
+
+def test_next_packed_states_bonus():
+    codec = entity_codec(bonus_container)
+    todo = [bonus_entity_state]
+    seen = {bonus_entity_state}
+    while todo:
+        es = todo.pop()
+        successors = next_states(es)
+        assert {decode_state(codec, code) for code in next_packed_states(codec, encode_state(es))} == successors
+        todo.extend(successors - seen)
+        seen |= successors
+    assert len(seen) == 162
+
+def test_successor_plan():
+    plan = successor_plan(entity_codec(container))
+    # inflow, outflow, volume: outflow is forced by volume, so settles with it
+    assert plan.magnitudes_settled == ((0,), (), (1, 2))
+    assert plan.forcing[1] == ((2, 2, 2), (2, 0, 0))
+
+def test_valid_packed_states():
+    codec = entity_codec(container)
+    names = list(container.quantities)
+    spaces = [list(container.quantities[k].quantitySpace) for k in names]
+    pairs = [[(m, d) for m in space for d in (Direction.NEGATIVE, Direction.NEUTRAL, Direction.POSITIVE)] for space in spaces]
+    valid = set()
+    for combo in itertools.product(*pairs):
+        es = EntityState(container, {k: QuantityPair(*pair) for k, pair in zip(names, combo)})
+        if state_valid(es):
+            valid.add(es)
+    assert {decode_state(codec, code) for code in valid_packed_states(codec)} == valid
+
+def test_check_derivative_transitions_batched():
+    import prune
+    candidates = [FrozenDict({'volume': v, 'inflow': i, 'outflow': o}) for v, i, o in itertools.product(list(Direction)[1:], repeat=3)]
+    a = make_entity_state(container, {'volume': (Volume.PLUS, Direction.NEUTRAL), 'inflow': (Inflow.PLUS, Direction.NEUTRAL), 'outflow': (Outflow.PLUS, Direction.NEUTRAL)})
+    threshold = prune.BATCH_THRESHOLD
+    try:
+        prune.BATCH_THRESHOLD = 0
+        batched = check_derivative_transitions(entity_state, a, candidates)
+    finally:
+        prune.BATCH_THRESHOLD = threshold
+    assert batched == check_derivative_transitions(entity_state, a, candidates)
@@ -3,10 +3,27 @@ from container import *
 from mock import *
 from graph import *
 
+import pytest
+
 def test_make_entity():
     entity = make_entity('container', quantities, relations, {})
     assert entity.quantities['volume'] == Quantity('volume', Volume)
 
+def test_make_entity_tables():
+    entity = make_entity('container', quantities, relations, {})
+    assert entity.tables['volume'] is space_table(Volume)
+    assert entity_tables(entity) is entity.tables
+
+def test_space_table():
+    table = space_table(Volume)
+    assert table.members == (Volume.ZERO, Volume.PLUS, Volume.MAX)
+    assert table.index[Volume.MAX] == 2
+    assert table.extremes == (Direction.NEGATIVE, Direction.NEUTRAL, Direction.POSITIVE)
+    assert table.clip_signs == (-1, 0, 1)
+    assert table.points == (True, False, True)
+    assert table.nexts == (1, 2, 2)
+    assert table.prevs == (0, 0, 1)
+
 def test_make_entity_state():
     entity_state = make_entity_state(container, container_state)
     assert entity_state.state['volume'] == QuantityPair(Volume.ZERO, Direction.NEUTRAL)
@@ -15,6 +32,131 @@ def test_make_entity_state():
 #     sg = gen_state_graph(entity_state)
 #     assert draw_state_graph(sg)
 
+def test_gen_state_graph_orders():
+    dfs = gen_state_graph(entity_state)
+    bfs = gen_state_graph(entity_state, order='bfs')
+    assert len(dfs.states) == 17
+    assert set(dfs.states) == set(bfs.states)
+    assert set(dfs.edges) == set(bfs.edges)
+    assert len(dfs.edges) == len(bfs.edges) == 37
+    assert dfs.stats.states == 17 and not dfs.stats.truncated
+
+def test_gen_state_graph_budgets():
+    sg = gen_state_graph(entity_state, order='bfs', max_depth=1)
+    assert set(sg.states) == {state_key(entity_state)} | {state_key(s) for s in next_states(entity_state)}
+    assert sg.stats.truncated
+    sg = gen_state_graph(entity_state, max_states=5)
+    assert len(sg.states) == 5
+    assert all(a in sg.states and b in sg.states for a, b in sg.edges)
+    assert sg.stats.truncated
+
+def test_depth_limit_at_steady_state():
+    # a state without successors loses nothing to the depth limit
+    steady = make_entity_state(container, {**container_state, 'inflow': (Inflow.ZERO, Direction.NEUTRAL)})
+    assert not next_states(steady)
+    for workers in (1, 2):
+        sg = gen_state_graph(steady, order='bfs', max_depth=0, workers=workers)
+        assert len(sg.keys) == 1 and not sg.stats.truncated
+    assert gen_state_graph(entity_state, order='bfs', max_depth=0, workers=2).stats.truncated
+
+def test_gen_state_graph_canonical_keys():
+    sg = gen_state_graph(entity_state, compat_keys=False)
+    assert '0_3_0_2_0_2' in sg.states
+    assert len(sg.states) == 17
+
+def test_gen_state_graph_parallel():
+    serial = gen_state_graph(entity_state, order='bfs')
+    graphs = [gen_state_graph(entity_state, order='bfs', workers=workers, batch_size=batch_size) for workers, batch_size in ((2, 1), (3, 4))]
+    # deterministic regardless of the worker count and batch size
+    for sg in graphs:
+        assert sg.keys == serial.keys
+        assert sg.edges == serial.edges
+    # also under budgets
+    for budget in ({'max_states': 8}, {'max_depth': 2}):
+        (one, two) = (gen_state_graph(entity_state, order='bfs', workers=workers, **budget) for workers in (1, 2))
+        assert (one.keys, one.edges, one.stats.truncated) == (two.keys, two.edges, two.stats.truncated)
+    # parallel exploration cannot go depth-first
+    with pytest.raises(ValueError):
+        gen_state_graph(entity_state, workers=2)
+
+def test_iter_state_graph():
+    sg = gen_state_graph(entity_state)
+    seen = set()
+    edges = []
+    for event in iter_state_graph(entity_state):
+        if event[0] == 'node':
+            (_, k, state) = event
+            assert sg.states[k] == state
+            seen.add(k)
+        else:
+            (_, a, b) = event
+            # nodes are announced before their edges
+            assert a in seen and b in seen
+            edges.append((a, b))
+    assert seen == set(sg.states)
+    assert sorted(edges) == sorted(sg.edges)
+
+def test_iter_state_graph_options():
+    sg = gen_state_graph(entity_state, exogenous=True)
+    reports = []
+    events = list(iter_state_graph(entity_state, exogenous=True, progress=reports.append, progress_every=5))
+    edges = {event[1:] for event in events if event[0] == 'edge'}
+    assert edges == {(sg.keys[a], sg.keys[b], sg.edge_label(a, b)) for a, b in sg.edge_ids()}
+    assert len(reports) == len(sg.keys) // 5
+
+def test_iter_state_graph_early_stop():
+    stats = ExploreStats()
+    events = iter_state_graph(bonus_entity_state, order='bfs', stats=stats)
+    assert len(list(itertools.islice(events, 5))) == 5
+    events.close()
+    assert stats.expanded < 5
+
+def test_state_graph_adjacency():
+    sg = StateGraph({'a': None, 'b': None, 'c': None}, [('a', 'b'), ('b', 'c'), ('a', 'c'), ('a', 'b'), ('c', 'a')])
+    assert sg.num_edges() == 4
+    assert sg.edges == [('a', 'b'), ('a', 'c'), ('b', 'c'), ('c', 'a')]
+    assert sg.has_edge('a', 'c') and not sg.has_edge('c', 'b') and not sg.has_edge('a', 'x')
+    assert sg.successors('a') == ['b', 'c']
+    assert sg.predecessors('c') == ['b', 'a']
+    assert (sg.out_degree('a'), sg.in_degree('a')) == (2, 1)
+    assert list(sg.predecessor_ids(sg.ids['b'])) == [0]
+
+def test_gen_full_envisionment():
+    env = gen_full_envisionment(container)
+    assert len(env.seeds) == 85
+    assert set(env.seeds) <= set(env.graph.states)
+    for seed in env.seeds:
+        assert set(reached_states(env, seed)) == set(gen_state_graph(env.graph.states[seed]).states)
+
+def test_gen_state_graph_exogenous():
+    sg = gen_state_graph(entity_state, exogenous=True)
+    assert (len(sg.states), sg.num_edges(), len(sg.exogenous_edges)) == (66, 352, 202)
+    codec = entity_codec(container)
+    for a, b in sg.edge_ids():
+        (sa, sb) = (sg.states[sg.keys[a]], sg.states[sg.keys[b]])
+        assert check_transition(sa, sb)
+        endogenous = encode_state(sb) in next_packed_states(codec, encode_state(sa))
+        assert sg.edge_label(a, b) == (ENDOGENOUS if endogenous else EXOGENOUS)
+    # the endogenous graph is contained in the exogenous one
+    assert all(sg.has_edge(a, b) for a, b in gen_state_graph(entity_state).edges)
+    # an empty container at rest only changes by the inflow starting to rise
+    steady = make_entity_state(container, {**container_state, 'inflow': (Inflow.ZERO, Direction.NEUTRAL)})
+    transitions = next_packed_transitions(codec, encode_state(steady))
+    assert [decode_state(codec, code).state['inflow'].derivative for code in transitions] == [Direction.POSITIVE]
+    assert set(transitions.values()) == {EXOGENOUS}
+    with pytest.raises(ValueError):
+        gen_state_graph(entity_state, exogenous=True, order='bfs', workers=2)
+
+def test_reachability():
+    reach = reachability(['a', 'b', 'c', 'd'], [('a', 'b'), ('b', 'c'), ('c', 'b'), ('d', 'd')])
+    assert reach == {'a': 0b0111, 'b': 0b0110, 'c': 0b0110, 'd': 0b1000}
+
+def test_gen_state_graph_progress():
+    seen = []
+    gen_state_graph(entity_state, progress=lambda stats: seen.append(stats.frontier), progress_every=1)
+    assert len(seen) == 17
+    assert seen[-1] == 0
+
 def test_serialize_state():
     # print(serialize_state(entity_state))
     assert serialize_state(entity_state) == '''inflow: (0, 3)\noutflow: (0, 2)\nvolume: (0, 2)\n'''
@@ -22,6 +164,18 @@ def test_serialize_state():
 def test_state_key():
     # print(state_key(entity_state))
     assert state_key(entity_state) == 'inflow_0_3_outflow_0_2_volume_0_2_'
+    assert state_key(entity_state, compat=False) == '0_3_0_2_0_2'
+
+def test_state_key_compat():
+    for state in gen_state_graph(bonus_entity_state).states.values():
+        assert state_key(state) == re.sub(r"[^\w]+", '_', serialize_state(state))
+
+def test_canonical_key():
+    assert canonical_key(entity_state) == (0, 3, 0, 2, 0, 2)
+    # independent of the order of the state dict
+    reordered = EntityState(container, dict(reversed(list(entity_state.state.items()))))
+    assert canonical_key(reordered) == canonical_key(entity_state)
+    assert hash(reordered) == hash(entity_state)
 
 def test_inter_state_trace():
     # print(inter_state_trace(entity_state, entity_state))
@@ -31,8 +185,44 @@ def test_inter_state_trace():
 #     # print(intra_state_trace(entity_state))
 #     assert intra_state_trace(entity_state) == '''correspondence_valid: true\nderivatives:\n- Vol will stay at 0\n- In will go up from 0\n- Out will stay at 0\n'''
 
+def test_gen_dot_tooltips():
+    sg = gen_state_graph(entity_state)
+    k = state_key(entity_state)
+    (a, b) = sg.edges[0]
+    A = gen_dot(sg.states, sg.edges, tooltips='id')
+    assert A.get_node(k).attr['tooltip'] == str(sg.ids[k])
+    assert A.get_edge(a, b).attr['tooltip'] == f"{sg.ids[a]}-{sg.ids[b]}"
+    A = gen_dot(sg.states, sg.edges, tooltips='none')
+    assert not A.get_node(k).attr['tooltip']
+    assert A.get_node(k).attr['label'] == pretty_print(entity_state, 1)
+
+def test_explain():
+    sg = gen_state_graph(entity_state)
+    (a, b) = sg.edges[0]
+    assert explain(sg, 0) == explain(sg, sg.keys[0]) == intra_state_trace(sg.states[sg.keys[0]])
+    assert explain(sg, sg.ids[a], sg.ids[b]) == inter_state_trace(sg.states[a], sg.states[b])
+
+def test_trace_index():
+    sg = gen_state_graph(entity_state)
+    index = trace_index(sg)
+    assert len(index['nodes']) == 17 and len(index['edges']) == 37
+    assert index['nodes'][0]['state']['inflow'] == ['ZERO', 'POSITIVE']
+
 def test_to_pairs():
     assert to_pairs([1,2,3,4]) == [(1,2),(3,4)]
 
 def test_wrap_enums():
     assert wrap_enums((Quantity('volume', Volume), (0, 2))) == ('volume', QuantityPair(Volume.ZERO, Direction.NEUTRAL))
+
+def test_slotted_types():
+    import pickle
+    from dataclasses import FrozenInstanceError
+    pair = QuantityPair(Inflow.ZERO, Direction.POSITIVE)
+    assert QuantityPair(Inflow.ZERO, Direction.POSITIVE) is pair
+    assert pickle.loads(pickle.dumps(pair)) is pair
+    assert not hasattr(pair, '__dict__') and not hasattr(entity_state, '__dict__')
+    with pytest.raises(FrozenInstanceError):
+        pair.magnitude = Inflow.PLUS
+    copy = pickle.loads(pickle.dumps(entity_state))
+    assert copy == entity_state and hash(copy) == hash(entity_state)
+    assert pickle.loads(pickle.dumps(inflow)) == inflow
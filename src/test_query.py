@@ -0,0 +1,83 @@
+from query import *
+from analysis import shortest_path
+from container import *
+from mock import *
+
+import pytest
+
+def test_find_paths():
+    result = find_paths(entity_state, {'volume': Volume.MAX}, k=3)
+    assert [len(path) for path in result.paths] == [3, 4, 4]
+    path = result.paths[0]
+    assert path.states[0] == entity_state and path.states[-1].state['volume'].magnitude == Volume.MAX
+    assert len(path.traces) == 3 and path.traces[0] == inter_state_trace(*path.states[:2])
+    # every step is an edge of the state graph, and the first path is a shortest one
+    sg = gen_state_graph(entity_state)
+    assert all(sg.has_edge(a, b) for a, b in zip(path.keys, path.keys[1:]))
+    assert len(path) == len(shortest_path(sg, path.keys[0], path.keys[-1])) - 1
+    # the search stops before the whole graph is explored
+    assert result.stats.states < len(sg.states)
+
+def test_astar_and_bfs_agree():
+    goal = {'volume': (Volume.MAX, Direction.NEGATIVE)}
+    astar = find_paths(entity_state, goal, k=2)
+    bfs = find_paths(entity_state, goal, k=2, method='bfs')
+    assert [len(p) for p in astar.paths] == [len(p) for p in bfs.paths]
+    assert astar.stats.states <= bfs.stats.states
+    callable_goal = find_paths(entity_state, lambda state: state.state['volume'] == QuantityPair(Volume.MAX, Direction.NEGATIVE), k=2)
+    assert [len(p) for p in callable_goal.paths] == [len(p) for p in astar.paths]
+
+def test_unreachable_and_bounds():
+    # the container never empties while inflow keeps going
+    goal = {'inflow': Inflow.ZERO, 'volume': Volume.ZERO, 'outflow': Direction.NEGATIVE}
+    assert not can_reach(entity_state, goal)
+    result = find_paths(entity_state, {'volume': Volume.MAX}, max_depth=2)
+    assert not result.reachable and result.stats.truncated
+    result = find_paths(entity_state, {'volume': Volume.MAX}, max_states=2)
+    assert not result.reachable and result.stats.truncated
+    # cut-off branches do not truncate a search that found its k paths
+    result = find_paths(entity_state, {'volume': Volume.MAX}, k=3, method='bfs', max_depth=4)
+    assert [len(path) for path in result.paths] == [3, 4, 4] and not result.stats.truncated
+    assert find_paths(entity_state, {'volume': Volume.ZERO}).paths[0].keys == [state_key(entity_state)]
+
+def test_exogenous_paths():
+    empty = make_entity_state(container, {**container_state, 'inflow': (Inflow.ZERO, Direction.NEUTRAL)})
+    assert not can_reach(empty, {'volume': Volume.PLUS})
+    path = find_paths(empty, {'volume': Volume.PLUS}, exogenous=True).paths[0]
+    assert path.states[1].state['inflow'].derivative == Direction.POSITIVE
+
+def test_goal_errors():
+    with pytest.raises(ValueError):
+        find_paths(entity_state, {'level': Volume.MAX})
+    with pytest.raises(ValueError):
+        find_paths(entity_state, {'outflow': Volume.MAX})
+    with pytest.raises(ValueError):
+        find_paths(entity_state, {'volume': Volume.MAX}, method='dfs')
+
+def simple_paths(sg, a, is_goal):
+    '''every path from a ending at its first goal state, without revisits'''
+    if is_goal(a):
+        return [[a]]
+    paths = []
+    stack = [[a]]
+    while stack:
+        path = stack.pop()
+        for b in sg.successors(path[-1]):
+            if b not in path:
+                (paths if is_goal(b) else stack).append(path + [b])
+    return paths
+
+def test_k_shortest_paths():
+    goal = lambda state: state.state['volume'] == QuantityPair(Volume.MAX, Direction.NEGATIVE)
+    sg = gen_state_graph(entity_state)
+    expected = sorted(len(path) - 1 for path in simple_paths(sg, state_key(entity_state), lambda k: goal(sg.states[k])))
+    for method in METHODS:
+        paths = find_paths(entity_state, goal, k=8, method=method, explain=False).paths
+        assert [len(path) for path in paths] == expected[:8]
+        assert len({tuple(path.keys) for path in paths}) == 8
+        assert all(sg.has_edge(a, b) for path in paths for a, b in zip(path.keys, path.keys[1:]))
+        # later paths branch off states that shorter ones pass through
+        assert any(path.keys[:3] == paths[0].keys[:3] for path in paths[1:])
+    # asking for more paths than there are gives all of them
+    result = find_paths(entity_state, goal, k=len(expected) + 1, explain=False)
+    assert [len(path) for path in result.paths] == expected and not result.stats.truncated
@@ -0,0 +1,39 @@
+from render import *
+from graph import gen_dot
+from qr import *
+from mock import *
+
+import os
+import pytest
+
+def test_render_cached(tmp_path):
+    sg = gen_state_graph(entity_state)
+    source = gen_dot(sg.states, sg.edges, 'id').string()
+    cache_dir = str(tmp_path / 'cache')
+    paths = render(source, ['dot'], ['svg'], str(tmp_path), cache_dir, workers=1)
+    assert paths == {('dot', 'svg'): str(tmp_path / 'dot.svg')}
+    digest = content_hash(source)
+    assert sorted(os.listdir(cache_dir)) == [f"{digest}.dot.dot", f"{digest}.dot.svg"]
+    with open(paths['dot', 'svg']) as f:
+        svg = f.read()
+    assert '<svg' in svg
+    # a cache hit copies the drawing without laying out again
+    os.remove(os.path.join(cache_dir, f"{digest}.dot.dot"))
+    render(source, ['dot'], ['svg'], str(tmp_path), cache_dir, workers=1)
+    assert not os.path.exists(os.path.join(cache_dir, f"{digest}.dot.dot"))
+
+def test_render_other_engines(tmp_path):
+    # engines and formats beyond the defaults pass through to graphviz
+    paths = render('digraph { a -> b }', ['fdp'], ['pdf'], str(tmp_path), str(tmp_path / 'cache'))
+    with open(paths['fdp', 'pdf'], 'rb') as f:
+        assert f.read(4) == b'%PDF'
+    with pytest.raises(ValueError):
+        render('digraph { a -> b }', ['nosuchengine'], ['svg'], str(tmp_path), str(tmp_path / 'cache'))
+
+def test_draw_state_graph(tmp_path):
+    from graph import draw_state_graph, render_state_graph
+    sg = gen_state_graph(entity_state)
+    options = dict(layouts=['dot'], formats=['svg'], workers=1, cache_dir=str(tmp_path / 'cache'), out_dir=str(tmp_path))
+    A = draw_state_graph(sg, 'id', **options)
+    assert set(A.nodes()) == set(sg.keys)
+    assert render_state_graph(sg, 'id', **options) == {('dot', 'svg'): str(tmp_path / 'dot.svg')}
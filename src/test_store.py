@@ -0,0 +1,78 @@
+from store import *
+from qr import *
+from mock import *
+
+import pytest
+
+def test_save_load(tmp_path):
+    sg = gen_state_graph(entity_state)
+    path = str(tmp_path / 'graph.qrsg')
+    save_graph(sg, path)
+    with load_graph(path, container) as loaded:
+        assert len(loaded.codes) == 17
+        assert loaded.state_at(0) == sg.states[sg.keys[0]]
+        assert list(loaded.successor_ids(0)) == list(sg.successor_ids(0))
+        assert loaded.keys == sg.keys
+        assert loaded.edges == sg.edges
+        assert loaded.stats == sg.stats
+        assert all(loaded.has_edge(a, b) for (a, b) in sg.edges)
+        assert not loaded.has_edge(sg.keys[0], sg.keys[0])
+        assert loaded.predecessors(sg.keys[1]) == sg.predecessors(sg.keys[1])
+
+def test_canonical_keys(tmp_path):
+    sg = gen_state_graph(entity_state, compat_keys=False)
+    path = str(tmp_path / 'graph.qrsg')
+    save_graph(sg, path)
+    with load_graph(path, container) as loaded:
+        assert loaded.keys == sg.keys
+
+def test_schema_mismatch(tmp_path):
+    path = str(tmp_path / 'graph.qrsg')
+    save_graph(gen_state_graph(entity_state), path)
+    with pytest.raises(ValueError):
+        load_graph(path, bonus_container)
+
+def test_exogenous_edges(tmp_path):
+    sg = gen_state_graph(entity_state, exogenous=True)
+    path = str(tmp_path / 'graph.qrsg')
+    save_graph(sg, path)
+    with load_graph(path, container) as loaded:
+        assert loaded.exogenous_edges == sg.exogenous_edges
+        assert [loaded.edge_label(a, b) for a, b in loaded.edge_ids()] == [sg.edge_label(a, b) for a, b in sg.edge_ids()]
+
+def test_key_style(tmp_path):
+    sg = gen_state_graph(entity_state, compat_keys=False)
+    path = str(tmp_path / 'graph.qrsg')
+    with pytest.raises(ValueError):
+        save_graph(sg, path, compat_keys=True)
+    renamed = StateGraph({('a' + k): state for k, state in sg.states.items()})
+    with pytest.raises(ValueError):
+        save_graph(renamed, path)
+
+def test_invalid_file(tmp_path):
+    path = str(tmp_path / 'graph.qrsg')
+    save_graph(gen_state_graph(entity_state), path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with open(path, 'wb') as f:
+        f.write(data[:-8])
+    with pytest.raises(ValueError):
+        load_graph(path, container)
+    with open(path, 'wb') as f:
+        f.write(b'QRSGRAPH')
+    with pytest.raises(ValueError):
+        load_graph(path, container)
+
+def test_without_exogenous_edges(tmp_path):
+    # files written before exogenous edges were recorded load without them
+    sg = gen_state_graph(entity_state)
+    path = str(tmp_path / 'graph.qrsg')
+    save_graph(sg, path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    field = b'"exogenous_edges": [], '
+    assert field in data
+    with open(path, 'wb') as f:
+        f.write(data.replace(field, b' ' * len(field)))
+    with load_graph(path, container) as loaded:
+        assert loaded.exogenous_edges == set() and loaded.edges == sg.edges
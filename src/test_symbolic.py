@@ -0,0 +1,58 @@
+from symbolic import *
+from bdd import *
+from qr import *
+from container import *
+from mock import *
+
+import itertools
+
+def test_bdd():
+    bdd = BDD(3)
+    (a, b, c) = (bdd.ithvar(0), bdd.ithvar(1), bdd.ithvar(2))
+    f = bdd.or_(bdd.and_(a, b), c)
+    assert bdd.count(f, [0, 1, 2]) == 5
+    assert bdd.or_(bdd.and_(b, a), c) == f
+    assert bdd.exists(f, frozenset({0})) == bdd.or_(b, c)
+    assert bdd.and_exists(a, f, frozenset({0})) == bdd.or_(b, c)
+    assert bdd.rename(bdd.and_(a, b), {1: 2}) == bdd.and_(a, c)
+    assert len(list(bdd.assignments(f, [0, 1, 2]))) == 5
+    assert bdd.not_(bdd.not_(f)) == f
+
+def test_valid_states():
+    sym = SymbolicEntity(bonus_container)
+    valid = set(valid_packed_states(entity_codec(bonus_container)))
+    assert sym.count(sym.valid) == len(valid)
+    assert set(sym.packed(sym.valid)) == valid
+
+def test_image_matches_next_packed_states():
+    sym = SymbolicEntity(bonus_container)
+    codec = sym.codec
+    for state in gen_state_graph(bonus_entity_state).states.values():
+        code = encode_state(state)
+        assert set(sym.packed(sym.image(sym.codes([code])))) == next_packed_states(codec, code)
+
+def test_reachable():
+    sym = SymbolicEntity(bonus_container)
+    sg = gen_state_graph(bonus_entity_state)
+    reached = sym.reachable(sym.states([bonus_entity_state]))
+    assert sym.count(reached) == 162
+    assert sym.count_edges(reached) == 555
+    assert {state_key(state) for state in sym.decode(reached)} == set(sg.keys)
+    assert len(list(sym.decode(reached, limit=10))) == 10
+
+def test_symbolic_envisionment():
+    (sym, reached) = symbolic_envisionment(bonus_container)
+    env = gen_full_envisionment(bonus_container)
+    assert sym.count(reached) == len(env.graph.keys) == 1305
+    assert sym.count_edges(reached) == env.graph.num_edges()
+
+def test_dense_mesh():
+    # every pair related: the relation grows with the fan-in of a quantity, not exponentially
+    from bench import synthetic_entity
+    entity = synthetic_entity(8, 'mesh', influence_density=1.0, proportional_density=1.0)
+    sym = SymbolicEntity(entity)
+    codec = sym.codec
+    codes = list(itertools.islice(sym.packed(sym.valid), 0, None, 97))
+    assert codes
+    for code in codes:
+        assert set(sym.packed(sym.image(sym.codes([code])))) == next_packed_states(codec, code)
@@ -0,0 +1,101 @@
+from system import *
+from container import *
+from mock import container_state
+
+import pytest
+
+def tank(name: str) -> Entity:
+    return make_entity(name, quantities, relations, exogenous)
+
+def tank_states(tanks: List[Entity]) -> Dict[str, EntityState]:
+    return {t.name: make_entity_state(t, container_state) for t in tanks}
+
+def test_components():
+    tanks = [tank('a'), tank('b'), tank('c')]
+    system = make_system('tanks', tanks, [Influence(qualified(tanks[2], 'outflow'), qualified(tanks[0], 'volume'), Direction.POSITIVE)])
+    assert system.components == (('a', 'c'), ('b',))
+    assert list(system.entity.quantities)[:6] == [f"{k}.{q}" for k in 'ac' for q in ('inflow', 'outflow', 'volume')]
+    assert len(system.entity.relations) == 3 * len(relations) + 1
+    with pytest.raises(ValueError):
+        make_system('tanks', [tank('a'), tank('a')], [])
+    with pytest.raises(ValueError):
+        make_system('tanks', tanks, [Influence(Quantity('d.volume', Volume), qualified(tanks[0], 'volume'))])
+
+def test_system_state():
+    tanks = [tank('a'), tank('b')]
+    system = make_system('tanks', tanks, [])
+    states = tank_states(tanks)
+    state = make_system_state(system, states)
+    assert state.state['b.volume'] == QuantityPair(Volume.ZERO, Direction.NEUTRAL)
+    assert split_state(system, state) == states
+
+@pytest.mark.parametrize('coupled', [False, True])
+def test_system_graph_matches_flattened(coupled):
+    tanks = [tank('a'), tank('b')]
+    links = [Influence(qualified(tanks[0], 'outflow'), qualified(tanks[1], 'volume'), Direction.POSITIVE)] if coupled else []
+    system = make_system('tanks', tanks, links)
+    assert len(system.components) == (1 if coupled else 2)
+    states = tank_states(tanks)
+    sg = gen_system_graph(system, states)
+    reference = gen_state_graph(make_system_state(system, states))
+    assert set(sg.keys) == set(reference.keys)
+    assert set(sg.edges) == set(reference.edges)
+    # the point-before-range rule spans both tanks, so not every pair of tank states is reached
+    assert len(sg.keys) == 17 * 17 - 32
+
+def test_system_graph_cross_relations():
+    # links both ways, so the first tank reads values of the second
+    tanks = [tank('a'), tank('b')]
+    links = [
+        Influence(qualified(tanks[1], 'outflow'), qualified(tanks[0], 'volume'), Direction.POSITIVE),
+        Proportional(qualified(tanks[0], 'volume'), qualified(tanks[1], 'outflow'), Direction.POSITIVE),
+        ValueCorrespondence(('a.volume', Volume.MAX), ('b.volume', Volume.MAX)),
+    ]
+    system = make_system('tanks', tanks, links)
+    assert system_factors(system)[0].imports == (('sign', 4),)
+    states = tank_states(tanks)
+    sg = gen_system_graph(system, states)
+    reference = gen_state_graph(make_system_state(system, states))
+    assert set(sg.keys) == set(reference.keys)
+    assert set(sg.edges) == set(reference.edges)
+
+def test_system_chain_factored():
+    # five containers, each feeding the next: moves are generated per
+    # container state and the sign of the outflow feeding it, not per state
+    # of all fifteen quantities
+    from memo import enable_memo, disable_memo
+    tanks = [tank(f"t{i}") for i in range(5)]
+    system = make_system('chain', tanks, [Influence(qualified(a, 'outflow'), qualified(b, 'volume'), Direction.POSITIVE) for a, b in zip(tanks, tanks[1:])])
+    assert len(system.components) == 1
+    states = tank_states(tanks)
+    memo = enable_memo()
+    try:
+        sg = gen_system_graph(system, states, order='bfs', max_states=200)
+    finally:
+        disable_memo()
+    assert memo.misses < sg.stats.expanded / 4
+    codec = entity_codec(system.entity)
+    successors = system_successors(system)
+    for k in sg.keys[:2]:
+        code = encode_state(sg.states[k])
+        assert successors(code) == next_packed_states(codec, code)
+
+def test_single_entity_system():
+    a = tank('a')
+    system = make_system('one', [a], [])
+    sg = gen_system_graph(system, tank_states([a]))
+    assert (len(sg.keys), sg.num_edges()) == (17, 37)
+
+def test_system_memo_bounded():
+    from memo import enable_memo, disable_memo
+    tanks = [tank('a'), tank('b')]
+    system = make_system('tanks', tanks, [])
+    states = tank_states(tanks)
+    reference = gen_system_graph(system, states)
+    memo = enable_memo(maxsize=4)
+    try:
+        sg = gen_system_graph(system, states)
+    finally:
+        disable_memo()
+    assert set(sg.edges) == set(reference.edges)
+    assert memo.stats()['size'] == 4 and memo.evictions > 0